@@ -0,0 +1,99 @@
+"""Sustained correction writes while a concurrent reader scans the table.
+
+Compares the original store (one connection and commit per insert, rollback
+journal) with the WAL store and its group-committing background writer.
+
+    python bench/corrections_db.py [--rows 2000] [--seed-rows 10000]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import modules.db as db
+from modules.executor import Saturated
+from loguru import logger
+
+logger.remove()
+
+
+def legacy_save(path, row):
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO corrections (image_path, record, true_label, predicted_label, processed) "
+                 "VALUES (?, ?, ?, ?, 0)", row)
+    conn.commit()
+    conn.close()
+
+
+def reader(path, stop, scans):
+    conn = sqlite3.connect(path, timeout=30)
+    while not stop.is_set():
+        conn.execute("SELECT * FROM corrections").fetchall()
+        scans.append(time.perf_counter())
+    conn.close()
+
+
+def run(mode, rows, seed_rows):
+    path = os.path.join(tempfile.mkdtemp(), "corrections.db")
+    db.DB_PATH = path
+    db.init_db()
+    if mode == "legacy":
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+    seed = sqlite3.connect(path)
+    seed.executemany("INSERT INTO corrections (image_path, true_label, predicted_label) VALUES (?, ?, ?)",
+                     [(f"seed_{i}.png", i % 10, 0) for i in range(seed_rows)])
+    seed.commit()
+    seed.close()
+
+    stop, scans = threading.Event(), []
+    scanner = threading.Thread(target=reader, args=(path, stop, scans))
+    scanner.start()
+
+    writer = db.CorrectionWriter()
+    if mode == "wal":
+        writer.start()
+    latencies, rejected = [], 0
+    start = time.perf_counter()
+    for i in range(rows):
+        row = ("corrections.u8", i, i % 10, (i + 1) % 10)
+        t = time.perf_counter()
+        if mode == "wal":
+            # A real client would get a 503 here; back off and retry
+            while True:
+                try:
+                    writer.submit(row)
+                    break
+                except Saturated:
+                    rejected += 1
+                    time.sleep(0.001)
+        else:
+            legacy_save(path, row)
+        latencies.append(time.perf_counter() - t)
+    if mode == "wal":
+        writer.flush()
+        writer.stop()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    scanner.join()
+
+    latencies = np.array(latencies) * 1e6
+    return {"writes_per_s": round(rows / elapsed), "call_p50_us": round(float(np.percentile(latencies, 50)), 1),
+            "call_p99_us": round(float(np.percentile(latencies, 99)), 1),
+            "reader_scans_per_s": round(len(scans) / elapsed, 1), "rejected": rejected}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--seed-rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(json.dumps({mode: run(mode, args.rows, args.seed_rows) for mode in ("legacy", "wal")}, indent=2))
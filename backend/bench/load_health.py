@@ -0,0 +1,102 @@
+"""Checks that /health stays responsive while /predict is saturated.
+
+Run against a live backend:
+
+    python bench/load_health.py --url http://localhost:8000 --concurrency 64 --duration 20
+"""
+import argparse
+import asyncio
+import itertools
+import io
+import time
+import httpx
+import numpy as np
+from PIL import Image, ImageDraw
+
+# More distinct images than the prediction cache holds, so cycling through
+# them measures decode and inference rather than cache hits
+IMAGE_POOL = 2048
+
+
+def create_image(rng):
+    """A 280x280 RGBA canvas with a random thick stroke."""
+    img = Image.new('L', (280, 280), color=0)
+    points = [tuple(int(v) for v in rng.integers(30, 250, 2)) for _ in range(rng.integers(2, 5))]
+    ImageDraw.Draw(img).line(points, fill=255, width=16)
+    buf = io.BytesIO()
+    img.convert('RGBA').save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
+
+
+def create_images(count=IMAGE_POOL, seed=0):
+    rng = np.random.default_rng(seed)
+    return [create_image(rng) for _ in range(count)]
+
+
+def percentiles(samples):
+    if not samples:
+        return {"p50": None, "p99": None, "count": 0}
+    arr = np.array(samples) * 1000
+    return {"p50": round(float(np.percentile(arr, 50)), 2),
+            "p99": round(float(np.percentile(arr, 99)), 2),
+            "count": len(samples)}
+
+
+async def probe_health(client, stop, samples, interval=0.02):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/health")
+        response.raise_for_status()
+        samples.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+
+
+async def flood_predict(client, stop, images, statuses):
+    while not stop.is_set():
+        image = next(images)
+        try:
+            response = await client.post("/predict", files={"file": ("load.png", image, "image/png")})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        except httpx.HTTPError:
+            statuses["error"] = statuses.get("error", 0) + 1
+
+
+async def measure(url, concurrency, duration):
+    # Shared by all flooding tasks, so no two consecutive requests send the same image
+    images = itertools.cycle(create_images())
+    limits = httpx.Limits(max_connections=concurrency + 2)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        # Separate client so health probes never wait behind predict connections
+        async with httpx.AsyncClient(base_url=url, timeout=60) as health_client:
+            idle = []
+            stop = asyncio.Event()
+            probe = asyncio.create_task(probe_health(health_client, stop, idle))
+            await asyncio.sleep(duration / 2)
+            stop.set()
+            await probe
+
+            loaded, statuses = [], {}
+            stop = asyncio.Event()
+            tasks = [asyncio.create_task(flood_predict(client, stop, images, statuses)) for _ in range(concurrency)]
+            await asyncio.sleep(1)  # let the flood ramp up before probing
+            probe = asyncio.create_task(probe_health(health_client, stop, loaded))
+            await asyncio.sleep(duration)
+            stop.set()
+            await asyncio.gather(probe, *tasks)
+
+    return {"health_idle_ms": percentiles(idle),
+            "health_under_load_ms": percentiles(loaded),
+            "predict_statuses": statuses}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20)
+    args = parser.parse_args()
+
+    result = asyncio.run(measure(args.url, args.concurrency, args.duration))
+    print(f"/health idle:       {result['health_idle_ms']}")
+    print(f"/health under load: {result['health_under_load_ms']}")
+    print(f"/predict statuses:  {result['predict_statuses']}")
@@ -0,0 +1,76 @@
+"""Compares per-image preprocessing cost of the original PIL pipeline and MNISTModel.preprocess.
+
+    python bench/preprocess.py [--repeat 500]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import timeit
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from modules.model import MNISTModel
+
+
+def legacy_preprocess(image_bytes):
+    # Pipeline used by /predict before the fast path
+    img = Image.open(io.BytesIO(image_bytes))
+    img = img.resize((28, 28))
+    img = img.convert('L')
+    img_array = np.array(img)
+    img_array = img_array.astype('float32') / 255
+    return img_array.reshape(1, 28, 28, 1)
+
+
+def fast_preprocess(model, image_bytes):
+    # Includes the per-image share of the batch normalization
+    return model.preprocess(image_bytes).astype(np.float32) * np.float32(1 / 255)
+
+
+def canvas(size, mode):
+    img = Image.new('L', (size, size), color=255)
+    for i in range(size // 5, size - size // 5):
+        for w in range(-size // 20, size // 20):
+            img.putpixel((i, min(size - 1, max(0, i + w))), 0)
+    return img.convert(mode)
+
+
+def encode(img, fmt):
+    buf = io.BytesIO()
+    img.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def inputs():
+    small = canvas(28, 'L')
+    npy = io.BytesIO()
+    np.save(npy, np.asarray(small))
+    return {
+        "png_28x28_L": encode(small, "PNG"),
+        "png_280x280_RGBA": encode(canvas(280, 'RGBA'), "PNG"),
+        "jpeg_280x280_RGB": encode(canvas(280, 'RGB'), "JPEG"),
+        "raw_28x28_uint8": np.asarray(small).tobytes(),
+        "npy_28x28_uint8": npy.getvalue(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    model = MNISTModel()
+    results = {}
+    for name, data in inputs().items():
+        fast = min(timeit.repeat(lambda: fast_preprocess(model, data), number=args.repeat, repeat=3)) / args.repeat
+        try:
+            legacy = min(timeit.repeat(lambda: legacy_preprocess(data), number=args.repeat, repeat=3)) / args.repeat
+        except Exception:
+            legacy = None  # raw buffers and .npy were not accepted before
+        results[name] = {"legacy_us": round(legacy * 1e6, 1) if legacy else None,
+                         "fast_us": round(fast * 1e6, 1)}
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,49 @@
+"""Measures backend cold start and memory for each inference runtime.
+
+Each runtime is started in a fresh interpreter that imports the model module
+and serves one prediction. Requires an existing model (and, for the numpy
+runtime, a bundle produced by export_model.py).
+
+    python bench/startup.py [--runs 3]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import resource, time, numpy as np
+start = time.perf_counter()
+from modules.model import mnist_model
+loaded = time.perf_counter()
+mnist_model.predict_batch(np.zeros((1, 28, 28, 1), dtype='float32'))
+first = time.perf_counter()
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, loaded - start, first - start)
+"""
+
+
+def measure(runtime):
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(BACKEND_DIR), INFERENCE_RUNTIME=runtime, TF_CPP_MIN_LOG_LEVEL="3")
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", CHILD], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    wall = time.perf_counter() - start
+    rss_kb, load_s, first_prediction_s = output.strip().splitlines()[-1].split()
+    return {"process_wall_s": wall, "load_s": float(load_s),
+            "first_prediction_s": float(first_prediction_s), "peak_rss_mb": int(rss_kb) / 1024}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {}
+    for runtime in ("keras", "numpy"):
+        runs = [measure(runtime) for _ in range(args.runs)]
+        results[runtime] = {key: round(min(run[key] for run in runs), 3) for key in runs[0]}
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,261 @@
+"""Repeatable load test and micro-benchmarks, saved as JSON to compare commits.
+
+Load: concurrent clients send synthetic digits to /predict, /correct and
+/predict/batch (32 images per request). Each run reports p50/p95/p99 latency,
+requests/s and status codes at every concurrency level. By default the app runs
+in-process against a random-weight model in a temporary directory, so nothing
+else is needed; --url targets a running backend instead.
+
+Micro: per-image cost of MNISTModel.preprocess for each input format, and of
+MNISTModel.predict_batch for several batch sizes.
+
+    python bench/suite.py [--concurrency 1 8 32] [--requests 300] [--runtime numpy|keras]
+    python bench/suite.py --compare bench/results/<old>.json bench/results/<new>.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timezone
+import httpx
+import numpy as np
+from PIL import Image, ImageDraw
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(BACKEND_DIR))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "bench", "results")
+BATCH_IMAGES = 32
+SHAPES = [(3, 3, 1, 32), (32,), (3, 3, 32, 64), (64,), (1600, 128), (128,), (128, 10), (10,)]
+
+
+def synthetic_digit(rng, size=280):
+    """A random pen stroke on a black RGBA canvas, like the frontend sends."""
+    img = Image.new('L', (size, size), color=0)
+    points = [tuple(int(v) for v in rng.integers(size // 5, size * 4 // 5, 2)) for _ in range(rng.integers(2, 5))]
+    ImageDraw.Draw(img).line(points, fill=255, width=size // 14)
+    return img.convert('RGBA')
+
+
+def encode(img):
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def npy_bytes(array):
+    buf = io.BytesIO()
+    np.save(buf, array)
+    return buf.getvalue()
+
+
+def percentiles(samples):
+    arr = np.array(samples) * 1000
+    return {f"p{q}_ms": round(float(np.percentile(arr, q)), 2) for q in (50, 95, 99)} if len(arr) else {}
+
+
+def seed_model(model_dir, runtime):
+    """Publishes a random-weight model version like the training flow does."""
+    numpy_path = os.path.join(model_dir, "mnist_model-bench_npy")
+    keras_path = os.path.join(model_dir, "mnist_model-bench.h5")
+    if runtime == "keras":
+        from mnistlib.model import build_model, export_numpy_bundle
+        model = build_model()
+        model.save(keras_path)
+        export_numpy_bundle(model, numpy_path)
+    else:
+        from mnistlib.model import BUNDLE_FORMAT
+        os.makedirs(numpy_path)
+        rng = np.random.default_rng(0)
+        for i, shape in enumerate(SHAPES):
+            np.save(os.path.join(numpy_path, f"{i}.npy"), rng.normal(0, 0.1, size=shape).astype('float32'))
+        with open(os.path.join(numpy_path, "manifest.json"), "w") as f:
+            json.dump({"format": BUNDLE_FORMAT, "shapes": SHAPES}, f)
+    with open(os.path.join(model_dir, "current.json"), "w") as f:
+        json.dump({"version": "bench", "keras": keras_path, "numpy": numpy_path}, f)
+
+
+def configure_local_app(workdir, runtime):
+    """Points the backend at a throwaway data directory and returns the app."""
+    import modules.model
+    import modules.db
+    import mnistlib.pack
+    from loguru import logger
+    logger.remove()
+
+    model_dir = os.path.join(workdir, "models")
+    os.makedirs(model_dir)
+    seed_model(model_dir, runtime)
+    modules.model.MODEL_DIR = model_dir
+    modules.model.CURRENT_POINTER = os.path.join(model_dir, "current.json")
+    modules.model.REGISTRY_PATH = os.path.join(model_dir, "registry.json")
+    modules.model.INFERENCE_RUNTIME = runtime
+    modules.db.DB_PATH = os.path.join(workdir, "corrections.db")
+    mnistlib.pack.PACK_PATH = os.path.join(workdir, "corrections", "corrections.u8")
+
+    from main import app
+    return app
+
+
+def request_factory(endpoint, rng):
+    """Returns a function building the next request's keyword arguments; every image is distinct."""
+    if endpoint == "/predict":
+        return lambda: {"files": {"file": ("digit.png", encode(synthetic_digit(rng)), "image/png")}}
+    if endpoint == "/correct":
+        return lambda: {"files": {"file": ("digit.png", encode(synthetic_digit(rng, 28)), "image/png")},
+                        "data": {"true_label": str(rng.integers(10)), "predicted_label": str(rng.integers(10))}}
+    if endpoint == "/predict/batch":
+        return lambda: {"files": {"files": ("batch.npy", npy_bytes(
+            rng.integers(0, 256, (BATCH_IMAGES, 28, 28), dtype=np.uint8)), "application/octet-stream")}}
+    raise ValueError(endpoint)
+
+
+async def load(client, endpoint, concurrency, requests, rng):
+    make = request_factory(endpoint, rng)
+    # Built up front so the clients measure the server, not image encoding
+    payloads = [make() for _ in range(requests)]
+    latencies, statuses = [], {}
+
+    async def worker():
+        while payloads:
+            payload = payloads.pop()
+            start = time.perf_counter()
+            try:
+                response = await client.post(endpoint, **payload)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = "error"
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    result = {"rps": round(len(latencies) / elapsed, 1), **percentiles(latencies),
+              "statuses": {str(k): v for k, v in statuses.items()}}
+    if endpoint == "/predict/batch":
+        result["images_per_s"] = round(len(latencies) * BATCH_IMAGES / elapsed)
+    return result
+
+
+async def run_load(app, url, endpoints, levels, requests):
+    rng = np.random.default_rng(0)
+    async with contextlib.AsyncExitStack() as stack:
+        if url:
+            limits = httpx.Limits(max_connections=max(levels))
+            client = httpx.AsyncClient(base_url=url, timeout=60, limits=limits)
+        else:
+            # ASGITransport does not run the lifespan (startup/shutdown), so enter it here
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+        await stack.enter_async_context(client)
+
+        deadline = time.time() + 60
+        while not (await client.get("/health")).json().get("ready"):
+            if time.time() > deadline:
+                raise TimeoutError("Backend did not become ready")
+            await asyncio.sleep(0.2)
+        results = {}
+        for endpoint in endpoints:
+            # Warm-up round, not recorded
+            await load(client, endpoint, 1, 5, rng)
+            results[endpoint] = {str(c): await load(client, endpoint, c, requests, rng) for c in levels}
+        return results
+
+
+def run_micro(repeat):
+    from modules.model import mnist_model
+    rng = np.random.default_rng(1)
+    raw = rng.integers(0, 256, (28, 28), dtype=np.uint8)
+    inputs = {
+        "raw_784": raw.tobytes(),
+        "npy": npy_bytes(raw),
+        "png_28": encode(Image.fromarray(raw)),
+        "png_280_rgba": encode(synthetic_digit(rng)),
+    }
+    results = {"preprocess_us": {}, "predict_batch_us_per_image": {}}
+    for name, payload in inputs.items():
+        seconds = min(timeit.repeat(lambda: mnist_model.preprocess(payload), number=repeat, repeat=3)) / repeat
+        results["preprocess_us"][name] = round(seconds * 1e6, 1)
+    for size in (1, 8, 32):
+        batch = rng.integers(0, 256, (size, 28, 28, 1), dtype=np.uint8)
+        number = max(1, repeat // size)
+        seconds = min(timeit.repeat(lambda: mnist_model.predict_batch(batch), number=number, repeat=3)) / number
+        results["predict_batch_us_per_image"][str(size)] = round(seconds / size * 1e6, 1)
+    return results
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def flatten(data, prefix=""):
+    for key, value in data.items():
+        if isinstance(value, dict):
+            yield from flatten(value, f"{prefix}{key}.")
+        elif isinstance(value, (int, float)) and not prefix.endswith("statuses."):
+            yield f"{prefix}{key}", value
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = dict(flatten({k: v for k, v in json.load(f).items() if k != "meta"}))
+    with open(new_path) as f:
+        new = dict(flatten({k: v for k, v in json.load(f).items() if k != "meta"}))
+    for key in sorted(old.keys() & new.keys()):
+        change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+        print(f"{key:60} {old[key]:>12} {new[key]:>12} {change:+7.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="running backend to load instead of an in-process app")
+    parser.add_argument("--runtime", choices=["numpy", "keras"], default="numpy")
+    parser.add_argument("--endpoints", nargs="+", default=["/predict", "/correct", "/predict/batch"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=300, help="requests per endpoint and concurrency level")
+    parser.add_argument("--repeat", type=int, default=500, help="iterations per micro-benchmark")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--out", default=RESULTS_DIR)
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit()
+
+    app = None if args.url else configure_local_app(tempfile.mkdtemp(), args.runtime)
+    results = {"meta": {"commit": git_commit(), "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                        "target": args.url or "in-process", "runtime": args.runtime, "cpus": os.cpu_count(),
+                        "python": platform.python_version(), "requests": args.requests}}
+    results["load"] = asyncio.run(run_load(app, args.url, args.endpoints, args.concurrency, args.requests))
+    if not args.skip_micro:
+        if args.url:
+            # Micro-benchmarks run locally on the in-process model
+            configure_local_app(tempfile.mkdtemp(), args.runtime)
+        from modules.model import mnist_model
+        mnist_model.load()
+        results["micro"] = run_micro(args.repeat)
+
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"{datetime.now(timezone.utc):%Y%m%d-%H%M%S}-{results['meta']['commit']}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Saved to {path}")
@@ -0,0 +1,120 @@
+"""Burst-upload benchmark: server memory under oversized uploads, and correction storage.
+
+A fresh backend (random-weight NumPy model, throwaway data directory) is
+started for each upload limit. It receives a burst of concurrent oversized
+/correct uploads, then canvas-sized corrections. The peak RSS of the server
+(VmHWM) is read once the burst has been answered. The stored size is the
+correction pack plus the database, compared to the PNGs the client sent.
+
+    python bench/uploads.py [--burst 32] [--size-mb 8] [--corrections 500]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+# Large enough to let every upload through
+NO_LIMIT = 1 << 40
+
+
+def peak_rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmHWM:")) / 1024
+
+
+def serve(workdir, port):
+    from suite import configure_local_app
+    import uvicorn
+    uvicorn.run(configure_local_app(workdir, "numpy"), host="127.0.0.1", port=port, log_level="warning")
+
+
+async def wait_until_ready(client, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if (await client.get("/health")).json().get("ready"):
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError("Backend did not become ready")
+
+
+async def burst(client, count, size):
+    # A PNG signature followed by junk, as a client bypassing the frontend could send
+    payload = b"\x89PNG" + os.urandom(size - 4)
+    form = {"true_label": "1", "predicted_label": "2"}
+
+    async def send():
+        try:
+            response = await client.post("/correct", files={"file": ("big.png", payload, "image/png")}, data=form)
+            return response.status_code
+        except httpx.HTTPError:
+            # The server may close the connection while the body is still being sent
+            return "closed"
+
+    statuses = await asyncio.gather(*(send() for _ in range(count)))
+    return {str(s): statuses.count(s) for s in set(statuses)}
+
+
+async def corrections(client, count):
+    from suite import encode, synthetic_digit
+    rng = np.random.default_rng(0)
+    sent = 0
+    for _ in range(count):
+        png = encode(synthetic_digit(rng))
+        sent += len(png)
+        await client.post("/correct", files={"file": ("digit.png", png, "image/png")},
+                          data={"true_label": str(rng.integers(10)), "predicted_label": str(rng.integers(10))})
+    return sent
+
+
+async def run(limit, args, port):
+    workdir = tempfile.mkdtemp()
+    env = {**os.environ, "MAX_UPLOAD_BYTES": str(limit), "PREPROCESS_WORKERS": "1"}
+    server = subprocess.Popen([sys.executable, __file__, "--serve", workdir, "--port", str(port)],
+                              cwd=BACKEND_DIR, env=env)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+            await wait_until_ready(client)
+            idle = peak_rss_mb(server.pid)
+            statuses = await burst(client, args.burst, args.size_mb * 1024 * 1024)
+            peak = peak_rss_mb(server.pid)
+            sent = await corrections(client, args.corrections)
+            # Let the writer thread commit the queued corrections
+            await asyncio.sleep(1)
+    finally:
+        server.terminate()
+        server.wait()
+    stored = sum(os.path.getsize(os.path.join(root, name))
+                 for root, _, names in os.walk(workdir) for name in names if "models" not in root)
+    return {"limit_bytes": limit, "burst_statuses": statuses, "idle_rss_mb": round(idle, 1),
+            "peak_rss_mb": round(peak, 1), "sent_png_bytes_per_correction": round(sent / args.corrections),
+            "stored_bytes_per_correction": round(stored / args.corrections)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--burst", type=int, default=32, help="concurrent oversized uploads")
+    parser.add_argument("--size-mb", type=int, default=8, help="size of each oversized upload")
+    parser.add_argument("--corrections", type=int, default=500, help="canvas-sized corrections stored afterwards")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serve", metavar="WORKDIR", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        sys.exit()
+
+    from modules.upload import MAX_UPLOAD_BYTES
+    results = {name: asyncio.run(run(limit, args, args.port))
+               for name, limit in (("no_limit", NO_LIMIT), ("limit", MAX_UPLOAD_BYTES))}
+    print(json.dumps(results, indent=2))
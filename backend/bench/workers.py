@@ -0,0 +1,99 @@
+"""Measures /predict throughput and memory as the number of uvicorn workers grows.
+
+For each worker count a fresh server is started with the NumPy runtime and
+memory-mapped weights, loaded with concurrent /predict requests, and the
+proportional set size (PSS, shared pages split between processes) of all its
+processes is summed. Requires a published model in /app/data.
+
+    python bench/workers.py --workers 1 2 4 --concurrency 64 --duration 15
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+import httpx
+from load_health import create_images, percentiles
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def process_tree(pid):
+    children = subprocess.run(["pgrep", "-P", str(pid)], capture_output=True, text=True).stdout.split()
+    return [pid] + [p for child in children for p in process_tree(int(child))]
+
+
+def total_pss_mb(pid):
+    total_kb = 0
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/smaps_rollup") as f:
+                total_kb += sum(int(line.split()[1]) for line in f if line.startswith("Pss:"))
+        except FileNotFoundError:
+            pass
+    return total_kb / 1024
+
+
+async def wait_until_ready(url, timeout=120):
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.time() < deadline:
+            try:
+                if (await client.get("/health")).json().get("ready"):
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise TimeoutError("Backend did not become ready")
+
+
+async def load(url, concurrency, duration):
+    images = itertools.cycle(create_images())
+    latencies, statuses = [], {}
+    deadline = time.perf_counter() + duration
+
+    async def worker(client):
+        while time.perf_counter() < deadline:
+            image = next(images)
+            start = time.perf_counter()
+            response = await client.post("/predict", files={"file": ("load.png", image, "image/png")})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return {"rps": round(len(latencies) / duration, 1), "latency_ms": percentiles(latencies), "statuses": statuses}
+
+
+def run(workers, port, concurrency, duration):
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(BACKEND_DIR), INFERENCE_RUNTIME="numpy", MODEL_MMAP="1", WEB_CONCURRENCY=str(workers),
+               # Measures decode and inference, not cache hits
+               PREDICTION_CACHE_SIZE="0")
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+                              cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        asyncio.run(wait_until_ready(url))
+        result = asyncio.run(load(url, concurrency, duration))
+        result["pss_mb"] = round(total_pss_mb(server.pid), 1)
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--port", type=int, default=8010)
+    args = parser.parse_args()
+
+    results = {n: run(n, args.port, args.concurrency, args.duration) for n in args.workers}
+    print(json.dumps({"cpu_count": os.cpu_count(), "workers": results}, indent=2))
@@ -0,0 +1,18 @@
+"""Exports the saved Keras model to the NumPy weight bundle served with INFERENCE_RUNTIME=numpy.
+
+    python export_model.py [--model /app/data/mnist_model.h5] [--out /app/data/mnist_model_npy]
+"""
+import argparse
+from loguru import logger
+from tensorflow.keras.models import load_model
+from mnistlib.model import export_numpy_bundle
+from modules.model import MODEL_PATH, NUMPY_MODEL_PATH
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--out", default=NUMPY_MODEL_PATH)
+    args = parser.parse_args()
+
+    export_numpy_bundle(load_model(args.model), args.out)
+    logger.info(f"Exported {args.model} to {args.out}")
@@ -1,21 +1,78 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
 from loguru import logger
 from sys import stderr
 import os
-import aiofiles
-from modules.model import mnist_model
-from modules.db import init_db, save_correction
+import time
+import asyncio
+from typing import List
+from modules.model import mnist_model, ModelNotReady, NPY_MAGIC
+from modules.db import init_db, save_correction, correction_writer
+from modules.batcher import MicroBatcher
+from modules.executor import Saturated, preprocess_pool
+from modules.metrics import render_metrics, REQUEST_LATENCY, PREDICT_STAGE_LATENCY
+from modules.cache import prediction_cache, image_key
+from modules.upload import BodySizeLimitMiddleware, MAX_UPLOAD_BYTES, MAX_BATCH_UPLOAD_BYTES
+from modules.stats import prediction_stats
+from mnistlib.pack import PACK_PATH
+
+PREDICT_BATCH_MAX_IMAGES = int(os.getenv("PREDICT_BATCH_MAX_IMAGES", "256"))
 
 app = FastAPI()
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES,
+                   route_limits={"/predict/batch": MAX_BATCH_UPLOAD_BYTES})
+batcher = MicroBatcher(mnist_model.predict_batch)
 
 logger.add(stderr, format="{time} {level} {message}", filter="my_module", level="INFO")
 logger.add("logs/api.log")
 
+model_loader = None
+stats_flusher = None
+reload_task = None
+
 @app.on_event("startup")
 def startup_event():
+    global model_loader, stats_flusher
     init_db()
+    correction_writer.start()
+    batcher.start()
+    # Load in the background so the API answers /health (not ready) right away,
+    # then keep following the published version
+    model_loader = asyncio.create_task(mnist_model.watch())
+    stats_flusher = asyncio.create_task(prediction_stats.run())
     logger.info("API started.")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in (model_loader, stats_flusher):
+        if task is not None:
+            task.cancel()
+    await batcher.stop()
+    # Commits whatever is still queued before exiting
+    await asyncio.to_thread(correction_writer.stop)
+    await asyncio.to_thread(prediction_stats.flush)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw URL, to keep cardinality bounded
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        REQUEST_LATENCY.labels(request.method, path, str(status)).observe(time.perf_counter() - start)
+
+def unavailable(e: Exception):
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+def ensure_ready():
+    if not mnist_model.ready:
+        raise ModelNotReady("Model not loaded yet")
+
 @app.get("/")
 async def homepage():
     return {"message": "Digit Recognition API"}
@@ -23,14 +80,62 @@ async def homepage():
 @app.post("/predict")
 async def predict_digit_endpoint(file: UploadFile = File(...)):
     try:
-        contents = await file.read()
-        prediction, probs = mnist_model.predict(contents)
+        ensure_ready()
+        with PREDICT_STAGE_LATENCY.labels("read").time():
+            contents = await file.read()
+        with PREDICT_STAGE_LATENCY.labels("preprocess").time():
+            img_array = await preprocess_pool.run(mnist_model.preprocess, contents)
+        with PREDICT_STAGE_LATENCY.labels("inference").time():
+            version, key = mnist_model.version, image_key(img_array)
+            probs = prediction_cache.get(version, key)
+            if probs is None:
+                probs = await batcher.submit(img_array)
+                prediction_cache.put(version, key, probs)
+            prediction_stats.observe(version, probs)
+        with PREDICT_STAGE_LATENCY.labels("serialize").time():
+            prediction = int(probs.argmax())
+            response = JSONResponse({"prediction": prediction, "probabilities": probs.tolist()})
         logger.info(f"Prediction: {prediction}")
-        return {"prediction": prediction, "probabilities": probs}
+        return response
+    except (Saturated, ModelNotReady) as e:
+        logger.warning(f"Rejecting prediction: {e}")
+        raise unavailable(e)
     except Exception as e:
         logger.error(f"Error during prediction: {e}")
         return {"error": str(e)}
 
+@app.post("/predict/batch")
+async def predict_batch_endpoint(files: List[UploadFile] = File(...)):
+    if len(files) > PREDICT_BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=413, detail=f"At most {PREDICT_BATCH_MAX_IMAGES} images per request")
+    try:
+        ensure_ready()
+        contents = [await file.read() for file in files]
+        if len(contents) == 1 and contents[0].startswith(NPY_MAGIC):
+            batch = await preprocess_pool.run(mnist_model.preprocess_npy, contents[0])
+        else:
+            batch = await preprocess_pool.run(mnist_model.preprocess_many, contents)
+        if len(batch) > PREDICT_BATCH_MAX_IMAGES:
+            raise HTTPException(status_code=413, detail=f"At most {PREDICT_BATCH_MAX_IMAGES} images per request")
+
+        version = mnist_model.version
+        probs = await batcher.run(batch)
+        prediction_stats.observe(version, probs)
+        predictions = probs.argmax(axis=1)
+        logger.info(f"Batch prediction: {len(predictions)} images")
+        return {"predictions": predictions.tolist(), "probabilities": probs.tolist()}
+    except HTTPException:
+        raise
+    except (Saturated, ModelNotReady) as e:
+        logger.warning(f"Rejecting batch prediction: {e}")
+        raise unavailable(e)
+    except ValueError as e:
+        logger.error(f"Invalid batch payload: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error during batch prediction: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/correct")
 async def correct_prediction(
     file: UploadFile = File(...),
@@ -38,30 +143,46 @@ async def correct_prediction(
     predicted_label: int = Form(...)
 ):
     try:
-        # Save image for retraining
-        filename = f"correction_{true_label}_{predicted_label}_{os.urandom(4).hex()}.png"
-        file_path = f"/app/data/corrections/{filename}"
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        
-        async with aiofiles.open(file_path, 'wb') as out_file:
-            content = await file.read()
-            await out_file.write(content)
-            
-        save_correction(file_path, true_label, predicted_label)
+        # Store the image as it will be trained on: one 784-byte record in the
+        # append-only pack instead of a loose PNG file
+        content = await file.read()
+        image = await preprocess_pool.run(mnist_model.preprocess, content)
+
+        # Only enqueues: the background writer appends the image to the pack
+        # and group-commits to sqlite, so a rejected correction leaves nothing behind
+        save_correction(PACK_PATH, true_label, predicted_label, image=image)
         return {"status": "success", "message": "Correction saved"}
+    except Saturated as e:
+        logger.warning(f"Rejecting correction: {e}")
+        raise unavailable(e)
+    except ValueError as e:
+        logger.warning(f"Invalid correction image: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error saving correction: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/reload")
-async def reload_model():
+async def run_reload():
     try:
-        mnist_model.reload()
-        return {"status": "success", "message": "Model reloaded"}
+        await asyncio.to_thread(mnist_model.reload)
     except Exception as e:
         logger.error(f"Error reloading model: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/reload", status_code=202)
+async def reload_model():
+    # Loading and warming happen in the background; requests keep being
+    # served by the active model until the new one is swapped in
+    global reload_task
+    if reload_task is None or reload_task.done():
+        reload_task = asyncio.create_task(run_reload())
+    return {"status": "accepted", "message": "Model reload started", "active_version": mnist_model.version}
 
 @app.get('/health')
 async def health():
-    return { "status": "ok" }
\ No newline at end of file
+    return { "status": "ok", "ready": mnist_model.ready, "model_version": mnist_model.version,
+             "model_variant": mnist_model.variant }
+
+@app.get("/metrics")
+def metrics():
+    data, content_type = render_metrics()
+    return Response(content=data, media_type=content_type)
@@ -0,0 +1,46 @@
+"""Moves corrections stored as loose PNG files into the correction pack.
+
+Each PNG is preprocessed exactly like a /correct upload, appended to the pack
+and its row repointed to the pack record. Safe to re-run: only rows without a
+record are migrated.
+
+    python migrate_corrections.py [--delete]
+"""
+import argparse
+import os
+from loguru import logger
+import modules.db as db
+from modules.model import mnist_model
+from mnistlib.pack import append_image, PACK_PATH
+
+COMMIT_EVERY = 500 # Migrated rows per transaction, so an interrupted run keeps its progress
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--delete", action="store_true", help="remove each PNG once its row is migrated")
+    args = parser.parse_args()
+
+    db.init_db()
+    conn = db.connect()
+    rows = conn.execute("SELECT id, image_path FROM corrections WHERE record IS NULL ORDER BY id").fetchall()
+    migrated, migrated_paths = 0, []
+    for row_id, image_path in rows:
+        try:
+            with open(image_path, "rb") as f:
+                record = append_image(mnist_model.preprocess(f.read()))
+        except Exception as e:
+            logger.warning(f"Skipping correction {row_id} ({image_path}): {e}")
+            continue
+        conn.execute("UPDATE corrections SET image_path = ?, record = ? WHERE id = ?", (PACK_PATH, record, row_id))
+        migrated += 1
+        migrated_paths.append(image_path)
+        if migrated % COMMIT_EVERY == 0:
+            conn.commit()
+    conn.commit()
+    conn.close()
+
+    # Only delete once the rows pointing at the pack are committed
+    if args.delete:
+        for image_path in migrated_paths:
+            os.remove(image_path)
+    logger.info(f"Migrated {migrated} of {len(rows)} PNG corrections into {PACK_PATH}")
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from loguru import logger
+from modules.metrics import BATCH_SIZE, BATCH_QUEUE_WAIT, QUEUE_DEPTH
+from modules.executor import Saturated
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+BATCH_MAX_QUEUE = int(os.getenv("BATCH_MAX_QUEUE", "256"))
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-image requests into one model call.
+
+    Requests are queued by `submit`. A background task takes the first queued
+    request, waits up to `max_wait_ms` for more to arrive (or until
+    `max_batch_size` is reached), stacks them and runs `predict_fn` once on a
+    dedicated thread. Each caller then receives its own row of the result.
+    Stacked batches passed to `run` count one per image against the same
+    `max_queue` capacity; once it is full, `submit` and `run` raise `Saturated`.
+    """
+
+    def __init__(self, predict_fn, max_batch_size: int = BATCH_MAX_SIZE, max_wait_ms: float = BATCH_MAX_WAIT_MS,
+                 max_queue: int = BATCH_MAX_QUEUE):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self._queue = None
+        self._task = None
+        self._batch_images = 0 # Images of stacked batches waiting for or in the inference thread
+        self._executor = None
+
+    def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Batcher started (max_batch_size={self.max_batch_size}, max_wait_ms={self.max_wait * 1000:g})")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def submit(self, x):
+        if self._task is None:
+            raise Exception("Batcher not started")
+        if self._queue.qsize() + self._batch_images >= self.max_queue:
+            raise Saturated("Prediction queue is full")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((x, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            raise Saturated("Prediction queue is full")
+        QUEUE_DEPTH.inc()
+        return await future
+
+    async def run(self, batch):
+        """Runs an already stacked batch on the inference thread, without waiting for other requests."""
+        if self._task is None:
+            raise Exception("Batcher not started")
+        if self._queue.qsize() + self._batch_images + len(batch) > self.max_queue:
+            raise Saturated("Prediction queue is full")
+        self._batch_images += len(batch)
+        try:
+            BATCH_SIZE.observe(len(batch))
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self.predict_fn, batch)
+        finally:
+            self._batch_images -= len(batch)
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already waiting before paying for a timed wait
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            QUEUE_DEPTH.dec(len(batch))
+            batch = [item for item in batch if not item[1].cancelled()]
+            if not batch:
+                continue
+
+            now = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                BATCH_QUEUE_WAIT.observe(now - enqueued_at)
+            BATCH_SIZE.observe(len(batch))
+
+            try:
+                inputs = np.stack([x for x, _, _ in batch])
+                outputs = await loop.run_in_executor(self._executor, self.predict_fn, inputs)
+            except Exception as e:
+                logger.error(f"Error during batched prediction: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future, _), output in zip(batch, outputs):
+                if not future.done():
+                    future.set_result(output)
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from modules.metrics import CACHE_HITS, CACHE_MISSES, CACHE_EVICTIONS
+
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "1024"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "300"))
+
+
+def image_key(img_array):
+    """Content hash of a preprocessed 28x28 uint8 image."""
+    return hashlib.blake2b(img_array.tobytes(), digest_size=16).digest()
+
+
+class PredictionCache:
+    """LRU cache of model outputs with a per-entry time-to-live.
+
+    Entries are keyed by model version and image hash, and the whole cache is
+    cleared whenever a new model is swapped in.
+    """
+
+    def __init__(self, max_size: int = PREDICTION_CACHE_SIZE, ttl: float = PREDICTION_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, version, key):
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get((version, key))
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end((version, key))
+                    CACHE_HITS.inc()
+                    return value
+                del self._entries[(version, key)]
+                CACHE_EVICTIONS.labels(reason="expired").inc()
+        CACHE_MISSES.inc()
+        return None
+
+    def put(self, version, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[(version, key)] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end((version, key))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                CACHE_EVICTIONS.labels(reason="capacity").inc()
+
+    def clear(self):
+        with self._lock:
+            if self._entries:
+                CACHE_EVICTIONS.labels(reason="model_swap").inc(len(self._entries))
+            self._entries.clear()
+
+
+prediction_cache = PredictionCache()
@@ -1,13 +1,41 @@
 import sqlite3
 import os
+import queue
+import threading
+import numpy as np
 from loguru import logger
+from modules.metrics import DB_WRITE_LATENCY, CORRECTION_QUEUE_DEPTH
+from modules.executor import Saturated
+from modules.retrain import retrain_trigger
+from mnistlib import corrections
+from mnistlib.pack import append_images
 
 DB_PATH = "/app/data/corrections.db"
+CORRECTION_QUEUE_SIZE = int(os.getenv("CORRECTION_QUEUE_SIZE", "1024"))
+CORRECTION_BATCH_SIZE = int(os.getenv("CORRECTION_BATCH_SIZE", "256"))
+
+_local = threading.local()
+
+def connect():
+    # WAL lets the Prefect flow read while we write, and NORMAL sync only
+    # fsyncs at checkpoints instead of on every commit
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def get_connection():
+    """Returns the calling thread's persistent connection."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != DB_PATH:
+        conn = connect()
+        _local.conn, _local.path = conn, DB_PATH
+    return conn
 
 def init_db():
     try:
         os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect()
         cursor = conn.cursor()
         
         # Create table if it doesn't exist
@@ -18,7 +46,8 @@ def init_db():
                 true_label INTEGER NOT NULL,
                 predicted_label INTEGER NOT NULL,
                 processed BOOLEAN DEFAULT 0,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                record INTEGER
             )
         ''')
         
@@ -28,63 +57,217 @@ def init_db():
         if 'processed' not in columns:
             logger.info("Migrating database: adding 'processed' column")
             cursor.execute("ALTER TABLE corrections ADD COLUMN processed BOOLEAN DEFAULT 0")
-            
+        # 'record' indexes the image in the correction pack; NULL for legacy PNG rows
+        if 'record' not in columns:
+            logger.info("Migrating database: adding 'record' column")
+            cursor.execute("ALTER TABLE corrections ADD COLUMN record INTEGER")
+
+        # (processed, id) serves both "count new rows" and "new rows after a cursor"
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_corrections_processed ON corrections (processed, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_corrections_timestamp ON corrections (timestamp)")
+
+        # Single-row counters of unprocessed corrections and of corrections
+        # since the last flow run, kept up to date by triggers, so checking
+        # the retrain threshold never counts rows
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS correction_stats (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                unprocessed INTEGER NOT NULL,
+                evaluated_id INTEGER NOT NULL DEFAULT 0,
+                since_evaluated INTEGER NOT NULL DEFAULT 0,
+                failed_runs INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        # Outcome of the last flow run, recorded by the flow (see mnistlib.corrections.record_run),
+        # and the number of corrections since the last id it considered
+        cursor.execute("PRAGMA table_info(correction_stats)")
+        stats_columns = [info[1] for info in cursor.fetchall()]
+        for column in ("evaluated_id", "since_evaluated", "failed_runs"):
+            if column not in stats_columns:
+                logger.info(f"Migrating database: adding '{column}' column to correction_stats")
+                cursor.execute(f"ALTER TABLE correction_stats ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+        if "since_evaluated" not in stats_columns:
+            cursor.execute("UPDATE correction_stats SET since_evaluated = "
+                           "(SELECT COUNT(*) FROM corrections WHERE id > evaluated_id)")
+        # Seeded from the table on first run, in the same transaction as the triggers
+        cursor.execute("INSERT OR IGNORE INTO correction_stats (id, unprocessed, since_evaluated) "
+                       "SELECT 1, COUNT(*) FILTER (WHERE processed = 0), COUNT(*) FROM corrections")
+        cursor.executescript('''
+            CREATE TRIGGER IF NOT EXISTS corrections_count_insert AFTER INSERT ON corrections
+            WHEN NEW.processed = 0 BEGIN
+                UPDATE correction_stats SET unprocessed = unprocessed + 1 WHERE id = 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS corrections_count_update AFTER UPDATE OF processed ON corrections
+            WHEN (OLD.processed = 0) != (NEW.processed = 0) BEGIN
+                UPDATE correction_stats
+                SET unprocessed = unprocessed + CASE WHEN NEW.processed = 0 THEN 1 ELSE -1 END WHERE id = 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS corrections_count_delete AFTER DELETE ON corrections
+            WHEN OLD.processed = 0 BEGIN
+                UPDATE correction_stats SET unprocessed = unprocessed - 1 WHERE id = 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS corrections_new_insert AFTER INSERT ON corrections BEGIN
+                UPDATE correction_stats SET since_evaluated = since_evaluated + 1
+                WHERE id = 1 AND NEW.id > evaluated_id;
+            END;
+            CREATE TRIGGER IF NOT EXISTS corrections_new_delete AFTER DELETE ON corrections BEGIN
+                UPDATE correction_stats SET since_evaluated = since_evaluated - 1
+                WHERE id = 1 AND OLD.id > evaluated_id;
+            END;
+        ''')
+
+        # Prediction statistics flushed by each backend worker, compared to a
+        # reference distribution by the flow
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS prediction_stats (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                model_version TEXT,
+                window_seconds REAL NOT NULL,
+                predictions INTEGER NOT NULL,
+                low_confidence INTEGER NOT NULL,
+                low_confidence_rate REAL NOT NULL,
+                summary TEXT NOT NULL
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_prediction_stats_version ON prediction_stats (model_version, timestamp)")
+
         conn.commit()
         conn.close()
         logger.info("Database initialized successfully.")
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
 
-def save_correction(image_path: str, true_label: int, predicted_label: int):
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO corrections (image_path, true_label, predicted_label, processed)
-            VALUES (?, ?, ?, 0)
-        ''', (image_path, true_label, predicted_label))
-        conn.commit()
-        conn.close()
-        logger.info(f"Correction saved: {image_path}, True: {true_label}, Pred: {predicted_label}")
-    except Exception as e:
-        logger.error(f"Error saving correction: {e}")
-        raise e
+class CorrectionWriter:
+    """Background thread that group-commits queued correction rows.
+
+    `submit` only enqueues, so /correct never waits on an fsync. The writer
+    drains everything queued so far, appends the images of the batch to the
+    correction pack in one write, inserts the rows in one transaction, then
+    passes the retraining backlog (see mnistlib.corrections.backlog) to `on_commit`. A row whose record is an
+    image array gets the pack index of that image.
+    """
+
+    _STOP = object()
+
+    def __init__(self, max_queue: int = CORRECTION_QUEUE_SIZE, max_batch: int = CORRECTION_BATCH_SIZE,
+                 on_commit=None):
+        self.max_batch = max_batch
+        self.on_commit = on_commit
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="correction-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(self._STOP)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, row):
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            raise Saturated("Correction write queue is full")
+        CORRECTION_QUEUE_DEPTH.inc()
+
+    def flush(self):
+        """Blocks until every submitted row has been committed."""
+        self._queue.join()
+
+    def _run(self):
+        conn = None
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = any(item is self._STOP for item in batch)
+            rows = [item for item in batch if item is not self._STOP]
+            if rows:
+                CORRECTION_QUEUE_DEPTH.dec(len(rows))
+                conn = self._write(conn, rows)
+            for _ in batch:
+                self._queue.task_done()
+        if conn is not None:
+            conn.close()
+
+    def _write(self, conn, rows):
+        try:
+            if conn is None:
+                conn = connect()
+            rows = pack_images(rows)
+            with DB_WRITE_LATENCY.time():
+                conn.executemany('''
+                    INSERT INTO corrections (image_path, record, true_label, predicted_label, processed)
+                    VALUES (?, ?, ?, ?, 0)
+                ''', rows)
+                conn.commit()
+            logger.info(f"Committed {len(rows)} corrections")
+        except Exception as e:
+            if conn is not None:
+                conn.rollback()
+            logger.error(f"Error saving {len(rows)} corrections: {e}")
+            return conn
+        if self.on_commit is not None:
+            try:
+                self.on_commit(corrections.backlog(conn))
+            except Exception as e:
+                logger.error(f"Error in correction commit hook: {e}")
+        return conn
+
+def pack_images(rows):
+    """Appends the images carried by rows to their pack and replaces them by their record index."""
+    by_pack = {}
+    for image_path, image, _, _ in rows:
+        if isinstance(image, np.ndarray):
+            by_pack.setdefault(image_path, []).append(image)
+    if not by_pack:
+        return rows
+    next_record = {path: append_images(np.stack(images), path) for path, images in by_pack.items()}
+    packed = []
+    for image_path, image, true_label, predicted_label in rows:
+        if isinstance(image, np.ndarray):
+            image = next_record[image_path]
+            next_record[image_path] += 1
+        packed.append((image_path, image, true_label, predicted_label))
+    return packed
+
+correction_writer = CorrectionWriter(on_commit=retrain_trigger.notify)
+
+def save_correction(image_path: str, true_label: int, predicted_label: int, record: int = None, image=None):
+    """Queues a correction; `image` (28x28 uint8) is appended to the pack by the writer."""
+    correction_writer.submit((image_path, record if image is None else image, true_label, predicted_label))
+    logger.info(f"Correction queued: {image_path}, True: {true_label}, Pred: {predicted_label}")
 
 def get_corrections(processed_status: bool = None):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
+        conn = get_connection()
         query = 'SELECT * FROM corrections'
         params = []
-        
+
         if processed_status is not None:
             query += ' WHERE processed = ?'
             params.append(1 if processed_status else 0)
-            
-        cursor.execute(query, params)
-        columns = [column[0] for column in cursor.description]
-        results = []
-        for row in cursor.fetchall():
-            results.append(dict(zip(columns, row)))
-        conn.close()
-        return results
+
+        # sqlite3.Row gives by-name access without building a dict per row
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        return cursor.execute(query, params).fetchall()
     except Exception as e:
         logger.error(f"Error retrieving corrections: {e}")
         return []
 
-def mark_corrections_as_processed(ids: list):
-    if not ids:
-        return
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        # id_list_str = ','.join(['?'] * len(ids))
-        # cursor.execute(f'UPDATE corrections SET processed = 1 WHERE id IN ({id_list_str})', ids)
-        # Simplified for safer large lists or just easier logic:
-        cursor.execute(f'UPDATE corrections SET processed = 1 WHERE id IN ({",".join(map(str, ids))})')
-        conn.commit()
-        conn.close()
-        logger.info(f"Marked {len(ids)} corrections as processed.")
-    except Exception as e:
-        logger.error(f"Error marking corrections as processed: {e}")
+def count_unprocessed():
+    return corrections.count_unprocessed(get_connection())
+
+
+def read_backlog():
+    return corrections.backlog(get_connection())
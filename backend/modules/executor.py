@@ -0,0 +1,45 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from modules.metrics import POOL_PENDING
+
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", str(os.cpu_count() or 1)))
+PREPROCESS_QUEUE = int(os.getenv("PREPROCESS_QUEUE", "64"))
+
+
+class Saturated(Exception):
+    pass
+
+
+class BoundedExecutor:
+    """Thread pool that refuses work instead of queueing it without limit.
+
+    At most `max_workers` calls run at once and at most `max_queue` more wait
+    for a thread. Past that, `run` raises `Saturated` immediately so the
+    endpoint can answer 503 rather than letting latency grow.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.capacity = max_workers + max_queue
+        self.pending = 0
+        self._gauge = POOL_PENDING.labels(pool=name)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    async def run(self, fn, *args):
+        # Only touched from the event loop thread, so no lock is needed
+        if self.pending >= self.capacity:
+            raise Saturated(f"{self.name} pool is saturated")
+        self.pending += 1
+        self._gauge.inc()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+            self._gauge.dec()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+preprocess_pool = BoundedExecutor("preprocess", PREPROCESS_WORKERS, PREPROCESS_QUEUE)
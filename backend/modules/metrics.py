@@ -0,0 +1,101 @@
+import os
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import REGISTRY, multiprocess
+
+# With several uvicorn workers, each process writes its samples under
+# PROMETHEUS_MULTIPROC_DIR and /metrics aggregates them
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by endpoint",
+    ["method", "path", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+PREDICT_STAGE_LATENCY = Histogram(
+    "predict_stage_duration_seconds",
+    "Time spent in each stage of /predict: read, preprocess, inference, serialize",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+BATCH_SIZE = Histogram(
+    "predict_batch_size",
+    "Number of images grouped into a single model call",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+BATCH_QUEUE_WAIT = Histogram(
+    "predict_batch_queue_wait_seconds",
+    "Time a request spent queued before its batch was sent to the model",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+QUEUE_DEPTH = Gauge(
+    "predict_queue_depth",
+    "Requests waiting for the inference thread",
+    multiprocess_mode="livesum",
+)
+
+POOL_PENDING = Gauge(
+    "executor_pending_tasks",
+    "Tasks running or queued in each bounded thread pool",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+
+MODEL_VERSION = Gauge(
+    "model_version_info",
+    "Model version currently served (1) or previously served (0)",
+    ["version"],
+    multiprocess_mode="liveall",
+)
+
+DB_WRITE_LATENCY = Histogram(
+    "correction_db_write_seconds",
+    "Latency of one group commit of corrections to the sqlite store",
+    buckets=LATENCY_BUCKETS,
+)
+
+CORRECTION_QUEUE_DEPTH = Gauge(
+    "correction_write_queue_depth",
+    "Corrections waiting to be committed by the background writer",
+    multiprocess_mode="livesum",
+)
+
+LOW_CONFIDENCE_RATE = Gauge(
+    "prediction_low_confidence_rate",
+    "Rolling share of predictions whose top probability is below LOW_CONFIDENCE",
+    multiprocess_mode="liveall",
+)
+
+CACHE_HITS = Counter("prediction_cache_hits_total", "Predictions served from the cache")
+CACHE_MISSES = Counter("prediction_cache_misses_total", "Predictions not found in the cache")
+CACHE_EVICTIONS = Counter(
+    "prediction_cache_evictions_total",
+    "Entries removed from the prediction cache",
+    ["reason"],
+)
+
+
+_active_version = None
+
+def set_model_version(version):
+    global _active_version
+    # Zero the previous label rather than removing it: in multiprocess mode
+    # removed samples would still be read back from the process's value file
+    if _active_version is not None:
+        MODEL_VERSION.labels(version=_active_version).set(0)
+    MODEL_VERSION.labels(version=version).set(1)
+    _active_version = version
+
+
+def render_metrics():
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -1,81 +1,222 @@
 import os
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.models import Sequential, load_model
-from tensorflow.keras.layers import Dense, Conv2D, Flatten, MaxPooling2D, Dropout
-from tensorflow.keras.datasets import mnist
-from tensorflow.keras.utils import to_categorical
 from loguru import logger
-from PIL import Image
-import io
+import json
+import asyncio
+import threading
+from mnistlib.preprocessing import decode_image, decode_npy, normalize, NPY_MAGIC
+from mnistlib.tflite import TFLiteModel, standalone_interpreter_available
+from modules.runtime import NumpyCNN
+from modules.cache import prediction_cache
+from modules.metrics import set_model_version
 
+# Legacy single-file artifacts, used when no versioned model has been published
 MODEL_PATH = "/app/data/mnist_model.h5"
+NUMPY_MODEL_PATH = "/app/data/mnist_model_npy"
+# Versioned artifacts published by the training flow. current.json is replaced
+# atomically and names the active version and its files.
+MODEL_DIR = "/app/data/models"
+CURRENT_POINTER = os.path.join(MODEL_DIR, "current.json")
+# Quantized variants of each version with their test accuracy and latency
+REGISTRY_PATH = os.path.join(MODEL_DIR, "registry.json")
+# "keras" loads the .h5 with TensorFlow, "numpy" serves the exported weight
+# bundle without importing TensorFlow at all
+INFERENCE_RUNTIME = os.getenv("INFERENCE_RUNTIME", "keras")
+
+MODEL_POLL_INTERVAL = float(os.getenv("MODEL_POLL_INTERVAL", "5"))
+# Memory-map the NumPy bundle so every worker process shares one copy of the
+# weights through the page cache
+MODEL_MMAP = os.getenv("MODEL_MMAP", "1") == "1"
+# "auto" serves the fastest registered variant whose test accuracy reaches
+# MIN_ACCURACY; a variant name (float32, float16, int8, pruned) forces that one
+MODEL_VARIANT = os.getenv("MODEL_VARIANT", "auto")
+MIN_ACCURACY = float(os.getenv("MIN_ACCURACY", "0.98"))
+
+
+class ModelNotReady(Exception):
+    pass
+
+
+def current_artifact():
+    """Returns (version, keras_path, numpy_path) of the model to serve."""
+    try:
+        with open(CURRENT_POINTER) as f:
+            pointer = json.load(f)
+        return pointer["version"], pointer["keras"], pointer.get("numpy")
+    except FileNotFoundError:
+        return "legacy", MODEL_PATH, NUMPY_MODEL_PATH
+
+
+def select_variant(version):
+    """Returns (name, registry entry) of the variant to serve.
+
+    The entry is None for the float32 model, which is then loaded according to
+    INFERENCE_RUNTIME.
+    """
+    try:
+        with open(REGISTRY_PATH) as f:
+            variants = json.load(f).get(version, {})
+    except FileNotFoundError:
+        variants = {}
+    if INFERENCE_RUNTIME == "numpy" and variants:
+        # The NumPy runtime must not import TensorFlow, so TFLite variants need
+        # a standalone interpreter. The registered float32 latency is the Keras
+        # one, not the NumPy runtime's, so it is left out of the comparison.
+        if not standalone_interpreter_available():
+            logger.info("No standalone TFLite interpreter installed, serving the NumPy bundle")
+            return "float32", None
+        variants = {name: variant for name, variant in variants.items() if variant["format"] != "keras"}
+    if not variants or MODEL_VARIANT == "float32":
+        return "float32", None
+
+    if MODEL_VARIANT != "auto":
+        if MODEL_VARIANT not in variants:
+            logger.warning(f"Variant {MODEL_VARIANT} not registered for version {version}, serving float32")
+            return "float32", None
+        name = MODEL_VARIANT
+    else:
+        eligible = {name: variant for name, variant in variants.items() if variant["accuracy"] >= MIN_ACCURACY}
+        if not eligible:
+            logger.warning(f"No variant of version {version} reaches accuracy {MIN_ACCURACY}, serving float32")
+            return "float32", None
+        name = min(eligible, key=lambda name: eligible[name]["latency_ms"])
+
+    variant = variants[name]
+    return name, None if variant["format"] == "keras" else variant
+
+
+def load_variant(variant):
+    try:
+        logger.info(f"Loading TFLite variant from {variant['path']}")
+        return TFLiteModel.load(variant["path"])
+    except Exception as e:
+        logger.error(f"Error loading variant {variant['path']}: {e}. Falling back to float32...")
+        return None
+
+
+def load_artifact(keras_path, numpy_path):
+    if INFERENCE_RUNTIME == "numpy":
+        if numpy_path and os.path.exists(numpy_path):
+            try:
+                logger.info(f"Loading NumPy bundle from {numpy_path}")
+                return NumpyCNN.load(numpy_path, mmap=MODEL_MMAP)
+            except Exception as e:
+                logger.error(f"Error loading NumPy bundle: {e}. Falling back to Keras...")
+        else:
+            logger.warning(f"NumPy bundle not found at {numpy_path}. Falling back to Keras...")
+
+    if not os.path.exists(keras_path):
+        logger.warning(f"Model not found at {keras_path}. Waiting for the training flow to produce one.")
+        return None
+    try:
+        from tensorflow.keras.models import load_model
+        logger.info(f"Loading model from {keras_path}")
+        return load_model(keras_path)
+    except Exception as e:
+        logger.error(f"Error loading model: {e}")
+        return None
+
 
 class MNISTModel:
+    # The backend never trains: the initial model is produced by the Prefect
+    # flow, and until an artifact exists the API reports itself not ready.
     def __init__(self):
         self.model = None
-        self.load_or_train()
+        self.version = None
+        self.variant = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.model is not None
+
+    def load(self):
+        """Loads and warms the current artifact, then swaps it in.
+
+        In-flight predictions keep using the model they started with. Returns
+        False (keeping any model already loaded) if no usable artifact exists.
+        """
+        with self._load_lock:
+            version, keras_path, numpy_path = current_artifact()
+            if self.model is not None and version == self.version and version != "legacy":
+                logger.info(f"Model version {version} already active")
+                return True
 
-    def load_or_train(self):
-        if os.path.exists(MODEL_PATH):
+            variant_name, variant = select_variant(version)
+            model = load_variant(variant) if variant is not None else None
+            if model is None:
+                variant_name = "float32"
+                model = load_artifact(keras_path, numpy_path)
+            if model is None:
+                return False
             try:
-                logger.info(f"Loading model from {MODEL_PATH}")
-                self.model = load_model(MODEL_PATH)
+                # Pay the graph-tracing cost here rather than on the first request
+                model.predict_on_batch(np.zeros((1, 28, 28, 1), dtype='float32'))
             except Exception as e:
-                logger.error(f"Error loading model: {e}. Retraining...")
-                self.train_initial_model()
-        else:
-            logger.info("Model not found. Training initial model...")
-            self.train_initial_model()
-
-    def train_initial_model(self):
-        (x_train, y_train), (x_test, y_test) = mnist.load_data()
-        
-        # Preprocessing
-        x_train = x_train.reshape(x_train.shape[0], 28, 28, 1).astype('float32') / 255
-        x_test = x_test.reshape(x_test.shape[0], 28, 28, 1).astype('float32') / 255
-        y_train = to_categorical(y_train)
-        y_test = to_categorical(y_test)
-
-        # Build model
-        model = Sequential([
-            Conv2D(32, kernel_size=(3, 3), activation='relu', input_shape=(28, 28, 1)),
-            MaxPooling2D(pool_size=(2, 2)),
-            Conv2D(64, kernel_size=(3, 3), activation='relu'),
-            MaxPooling2D(pool_size=(2, 2)),
-            Flatten(),
-            Dense(128, activation='relu'),
-            Dropout(0.5),
-            Dense(10, activation='softmax')
-        ])
-
-        model.compile(loss='categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
-        model.fit(x_train, y_train, validation_data=(x_test, y_test), epochs=5, batch_size=200, verbose=1)
-        
-        os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-        model.save(MODEL_PATH)
-        self.model = model
-        logger.info(f"Model trained and saved to {MODEL_PATH}")
+                logger.error(f"Error warming model version {version}: {e}")
+                return False
+
+            self.model, self.version, self.variant = model, version, variant_name
+            prediction_cache.clear()
+            set_model_version(version)
+            logger.info(f"Model version {version} ({variant_name}) is now active")
+            return True
+
+    async def watch(self):
+        """Keeps the served model in sync with the published pointer.
+
+        Every worker process runs this loop, so a new version published by the
+        flow, or reloaded through /reload on any single worker, reaches them all.
+        """
+        last_seen = None
+        while True:
+            try:
+                try:
+                    stamp = os.stat(CURRENT_POINTER).st_mtime_ns
+                except FileNotFoundError:
+                    stamp = None
+                if not self.ready or stamp != last_seen:
+                    was_ready = self.ready
+                    if await asyncio.to_thread(self.load):
+                        last_seen = stamp
+                        if not was_ready:
+                            logger.info("Model loaded, API ready.")
+            except Exception as e:
+                # A malformed pointer or registry must not end the loop: retry on the next poll
+                logger.error(f"Error following the published model: {e}")
+            await asyncio.sleep(MODEL_POLL_INTERVAL)
+
+    def preprocess(self, image_bytes):
+        """Decodes one image to a (28, 28, 1) uint8 array, exactly as the flow trains on it."""
+        return decode_image(image_bytes)
+
+    def preprocess_many(self, images):
+        return np.stack([self.preprocess(image_bytes) for image_bytes in images])
+
+    def preprocess_npy(self, npy_bytes):
+        return decode_npy(npy_bytes)
+
+    def predict_batch(self, batch):
+        # Read the reference once so a concurrent swap cannot change it mid-call
+        model = self.model
+        if model is None:
+            raise ModelNotReady("Model not loaded")
+
+        batch = normalize(batch)
+
+        # predict_on_batch skips the per-call setup of model.predict, which
+        # dominates for the small batches we serve
+        return np.asarray(model.predict_on_batch(batch))
 
     def predict(self, image_bytes):
-        if self.model is None:
-            raise Exception("Model not loaded")
-
-        img = Image.open(io.BytesIO(image_bytes))
-        img = img.resize((28, 28))
-        img = img.convert('L')
-        img_array = np.array(img)
-        
-        # Normalize and reshape
-        img_array = img_array.astype('float32') / 255
-        img_array = img_array.reshape(1, 28, 28, 1)
-
-        prediction_probs = self.model.predict(img_array)
+        img_array = self.preprocess(image_bytes).reshape(1, 28, 28, 1)
+        prediction_probs = self.predict_batch(img_array)
         prediction = np.argmax(prediction_probs)
         return int(prediction), prediction_probs.tolist()[0]
 
     def reload(self):
-        self.load_or_train()
+        if not self.load():
+            raise Exception("No usable model artifact, keeping the current model")
 
-# Global instance
+# Global instance, loaded in the background by the API startup
 mnist_model = MNISTModel()
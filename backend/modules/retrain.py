@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+import httpx
+from loguru import logger
+
+# Unset disables the trigger; the flow's schedule still picks corrections up
+PREFECT_API_URL = os.getenv("PREFECT_API_URL")
+RETRAIN_DEPLOYMENT = os.getenv("RETRAIN_DEPLOYMENT", "mnist_retraining_flow/mnist-retraining-deployment")
+DRIFT_THRESHOLD = int(os.getenv("DRIFT_THRESHOLD", "5")) # Retrain if > 5 corrections
+RETRAIN_DEBOUNCE_S = float(os.getenv("RETRAIN_DEBOUNCE_S", "300")) # Minimum time between two triggers
+TRIGGER_TAG = "correction-trigger"
+MAX_BACKOFF_DOUBLINGS = 6
+ACTIVE_STATES = ["PENDING", "RUNNING", "CANCELLING"]
+
+
+class RetrainTrigger:
+    """Starts a run of the retraining deployment once enough corrections are pending.
+
+    `notify` is called by the correction writer after each commit with the
+    backlog, so deciding costs nothing; `request` asks for a run for any other
+    reason. Both wait for corrections newer than the last run; after runs that
+    published no model, the number required doubles each time. The Prefect API is only
+    called when the threshold is crossed, at most once per debounce window,
+    from a separate thread, and never while a run is already active or queued.
+    """
+
+    def __init__(self, api_url: str = PREFECT_API_URL, deployment: str = RETRAIN_DEPLOYMENT,
+                 threshold: int = DRIFT_THRESHOLD, debounce: float = RETRAIN_DEBOUNCE_S, timeout: float = 10):
+        self.api_url = api_url
+        self.deployment = deployment
+        self.threshold = threshold
+        self.debounce = debounce
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._busy = False
+        self._last_attempt = float("-inf")
+        self._deployment_id = None
+
+    def required_new(self, failed_runs: int):
+        """New corrections needed since the last run, given how many runs in a row published nothing."""
+        if not failed_runs:
+            return 1
+        return (self.threshold + 1) * 2 ** min(failed_runs - 1, MAX_BACKOFF_DOUBLINGS)
+
+    def has_new_corrections(self, backlog):
+        """Whether enough corrections arrived since the last run for another to be worth asking for."""
+        _, new, failed_runs = backlog
+        return new >= self.required_new(failed_runs)
+
+    def notify(self, backlog):
+        """Takes (unprocessed, new since the last run, runs in a row that published nothing)."""
+        unprocessed = backlog[0]
+        if unprocessed > self.threshold and self.has_new_corrections(backlog):
+            self.request(f"{unprocessed} unprocessed corrections (> {self.threshold})")
+
+    def request(self, reason: str):
+        """Asks for a retraining run, unless one was asked for within the debounce window."""
+        if not self.api_url:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self._busy or now - self._last_attempt < self.debounce:
+                return
+            self._busy, self._last_attempt = True, now
+        threading.Thread(target=self._trigger, args=(reason,), name="retrain-trigger", daemon=True).start()
+
+    def _trigger(self, reason):
+        try:
+            with httpx.Client(base_url=self.api_url, timeout=self.timeout) as client:
+                self.trigger(client, reason)
+        except Exception as e:
+            # The next request after the debounce window retries
+            logger.error(f"Error triggering retraining: {e}")
+        finally:
+            with self._lock:
+                self._busy = False
+
+    def trigger(self, client, reason):
+        """Creates a flow run unless one is active or already queued. Returns its id, or None."""
+        if self._deployment_id is None:
+            response = client.get(f"/deployments/name/{self.deployment}")
+            response.raise_for_status()
+            self._deployment_id = response.json()["id"]
+
+        deployment = {"id": {"any_": [self._deployment_id]}}
+        active = self._count_runs(client, deployment, {"state": {"type": {"any_": ACTIVE_STATES}}})
+        # Scheduled runs we created earlier, waiting for the worker
+        queued = self._count_runs(client, deployment, {"state": {"type": {"any_": ["SCHEDULED"]}},
+                                                        "tags": {"all_": [TRIGGER_TAG]}})
+        if active or queued:
+            logger.info(f"{reason}, retraining already in progress.")
+            return None
+
+        response = client.post(f"/deployments/{self._deployment_id}/create_flow_run", json={"tags": [TRIGGER_TAG]})
+        response.raise_for_status()
+        run_id = response.json()["id"]
+        logger.info(f"{reason}, retraining run {run_id} created.")
+        return run_id
+
+    @staticmethod
+    def _count_runs(client, deployment, flow_runs):
+        response = client.post("/flow_runs/count", json={"deployments": deployment, "flow_runs": flow_runs})
+        response.raise_for_status()
+        return response.json()
+
+
+retrain_trigger = RetrainTrigger()
@@ -0,0 +1,65 @@
+import json
+import os
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from mnistlib.model import ARCHITECTURE, BUNDLE_FORMAT
+
+
+def _conv2d(x, kernel, bias):
+    # im2col: (N, H-2, W-2, C, 3, 3) windows -> (N*h*w, 3*3*C) matrix
+    kh, kw, c_in, c_out = kernel.shape
+    windows = sliding_window_view(x, (kh, kw), axis=(1, 2))
+    n, h, w = windows.shape[:3]
+    cols = windows.transpose(0, 1, 2, 4, 5, 3).reshape(n * h * w, kh * kw * c_in)
+    out = cols @ kernel.reshape(kh * kw * c_in, c_out) + bias
+    return out.reshape(n, h, w, c_out)
+
+
+def _maxpool2d(x):
+    n, h, w, c = x.shape
+    h, w = h // 2, w // 2
+    return x[:, :h * 2, :w * 2].reshape(n, h, 2, w, 2, c).max(axis=(2, 4))
+
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+
+class NumpyCNN:
+    """Inference-only forward pass of the MNIST CNN in plain NumPy.
+
+    Exposes `predict_on_batch` like a Keras model so it can be swapped in
+    without importing TensorFlow.
+    """
+
+    def __init__(self, weights):
+        self.weights = weights
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = False):
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        if manifest.get("format") != BUNDLE_FORMAT:
+            raise ValueError(f"Unsupported bundle format: {manifest.get('format')}")
+        # Read-only memory maps let several processes share the same pages
+        mmap_mode = "r" if mmap else None
+        weights = [np.load(os.path.join(path, f"{i}.npy"), mmap_mode=mmap_mode)
+                   for i in range(len(manifest["shapes"]))]
+        return cls(weights)
+
+    def predict_on_batch(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        weights = iter(self.weights)
+        for layer, _ in ARCHITECTURE:
+            if layer == "conv_relu":
+                x = np.maximum(_conv2d(x, next(weights), next(weights)), 0)
+            elif layer == "maxpool":
+                x = _maxpool2d(x)
+            elif layer == "flatten":
+                x = x.reshape(len(x), -1)
+            elif layer == "dense_relu":
+                x = np.maximum(x @ next(weights) + next(weights), 0)
+            elif layer == "dense_softmax":
+                x = _softmax(x @ next(weights) + next(weights))
+        return x
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from loguru import logger
+from mnistlib import drift
+from modules.db import get_connection, read_backlog
+from modules.metrics import LOW_CONFIDENCE_RATE
+from modules.retrain import retrain_trigger
+
+DRIFT_FLUSH_INTERVAL = float(os.getenv("DRIFT_FLUSH_INTERVAL", "60"))
+DRIFT_EWMA_ALPHA = float(os.getenv("DRIFT_EWMA_ALPHA", "0.01")) # Weight of each new prediction
+# Rolling low-confidence rate above which the flow is asked to check for drift; 0 disables
+DRIFT_LOW_CONFIDENCE_RATE = float(os.getenv("DRIFT_LOW_CONFIDENCE_RATE", "0.2"))
+
+
+class PredictionStats:
+    """Constant-memory aggregates of the predictions served, flushed to sqlite.
+
+    Each window holds per-class counts and confidence and entropy histograms
+    for each model version. A rolling (exponentially weighted) low-confidence
+    rate is kept across windows and exposed on /metrics.
+    """
+
+    def __init__(self, alpha: float = DRIFT_EWMA_ALPHA):
+        self.alpha = alpha
+        self.low_confidence_rate = 0.0
+        self._windows = {}
+        self._window_start = time.time()
+        self._lock = threading.Lock()
+
+    def observe(self, version, probs):
+        summary = drift.summarize(probs)
+        count, low = summary["count"], summary["low_confidence"]
+        with self._lock:
+            window = self._windows.get(version)
+            self._windows[version] = summary if window is None else drift.merge([window, summary])
+            # Same result as `count` single updates each seeing the batch's low-confidence share
+            decay = (1 - self.alpha) ** count
+            self.low_confidence_rate = self.low_confidence_rate * decay + low / count * (1 - decay)
+        LOW_CONFIDENCE_RATE.set(self.low_confidence_rate)
+
+    def take(self):
+        """Returns (window start, window end, {version: summary}) and starts a new window."""
+        with self._lock:
+            windows, start = self._windows, self._window_start
+            self._windows, self._window_start = {}, time.time()
+        return start, self._window_start, windows
+
+    def flush(self):
+        start, end, windows = self.take()
+        if not windows:
+            return 0
+        rows = [(version, end - start, summary["count"], summary["low_confidence"], self.low_confidence_rate,
+                 json.dumps({field: summary[field].tolist() for field in drift.FIELDS}))
+                for version, summary in windows.items()]
+        try:
+            conn = get_connection()
+            conn.executemany('''
+                INSERT INTO prediction_stats
+                    (model_version, window_seconds, predictions, low_confidence, low_confidence_rate, summary)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+        except Exception as e:
+            # The window is dropped: statistics are a sample, not a record
+            logger.error(f"Error flushing prediction statistics: {e}")
+            return 0
+        return sum(row[2] for row in rows)
+
+    async def run(self, interval: float = DRIFT_FLUSH_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.check)
+            except Exception as e:
+                logger.error(f"Error checking prediction statistics: {e}")
+
+    def check(self):
+        flushed = self.flush()
+        if flushed:
+            logger.info(f"Flushed statistics of {flushed} predictions "
+                        f"(low-confidence rate {self.low_confidence_rate:.3f})")
+        if not 0 < DRIFT_LOW_CONFIDENCE_RATE < self.low_confidence_rate:
+            return
+        # Corrections are what the flow trains on: without new ones since its
+        # last run, another run would reach the same verdict
+        backlog = read_backlog()
+        if backlog[0] > 0 and retrain_trigger.has_new_corrections(backlog):
+            retrain_trigger.request(f"Low-confidence rate {self.low_confidence_rate:.3f} "
+                                    f"(> {DRIFT_LOW_CONFIDENCE_RATE})")
+
+
+prediction_stats = PredictionStats()
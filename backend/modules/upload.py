@@ -0,0 +1,47 @@
+import os
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+# A 280x280 canvas PNG is a few KB; anything near these sizes is not a digit
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(1024 * 1024)))
+MAX_BATCH_UPLOAD_BYTES = int(os.getenv("MAX_BATCH_UPLOAD_BYTES", str(16 * 1024 * 1024)))
+
+
+class BodySizeLimitMiddleware:
+    """Answers 413 as soon as a request body exceeds its route's limit.
+
+    A declared Content-Length over the limit is refused before reading
+    anything. Otherwise bytes are counted as they stream in, so a chunked
+    upload is cut off at the limit instead of being buffered whole.
+    """
+
+    def __init__(self, app, max_bytes: int, route_limits: dict = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.route_limits = route_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        limit = self.route_limits.get(scope["path"], self.max_bytes)
+        detail = f"Request body larger than {limit} bytes"
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > limit:
+            # Reply without reading the body; the connection is closed after
+            response = JSONResponse({"detail": detail}, status_code=413, headers={"Connection": "close"})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside body parsing, turned into a 413 by the app
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
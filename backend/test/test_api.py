@@ -0,0 +1,149 @@
+import io
+import json
+import time
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+import modules.db
+import modules.model
+import mnistlib.pack
+from modules.model import mnist_model
+from mnistlib.model import BUNDLE_FORMAT
+from modules.cache import prediction_cache
+from modules.upload import MAX_UPLOAD_BYTES
+from modules.db import correction_writer, get_corrections
+from mnistlib.pack import open_pack
+from main import app
+
+SHAPES = [(3, 3, 1, 32), (32,), (3, 3, 32, 64), (64,), (1600, 128), (128,), (128, 10), (10,)]
+
+
+class FixedModel:
+    def predict_on_batch(self, batch):
+        probs = np.zeros((len(batch), 10), dtype='float32')
+        probs[:, 7] = 1
+        return probs
+
+
+def png_bytes():
+    buf = io.BytesIO()
+    Image.new('L', (28, 28), color=0).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def publish_bundle(model_dir, version):
+    path = model_dir / f"mnist_model-{version}_npy"
+    path.mkdir(parents=True)
+    rng = np.random.default_rng(0)
+    for i, shape in enumerate(SHAPES):
+        np.save(path / f"{i}.npy", rng.normal(size=shape).astype('float32'))
+    (path / "manifest.json").write_text(json.dumps({"format": BUNDLE_FORMAT, "shapes": SHAPES}))
+    pointer = {"version": version, "keras": str(model_dir / "missing.h5"), "numpy": str(path)}
+    (model_dir / "current.json").write_text(json.dumps(pointer))
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(modules.model, "MODEL_PATH", str(tmp_path / "missing.h5"))
+    monkeypatch.setattr(modules.model, "NUMPY_MODEL_PATH", str(tmp_path / "missing_npy"))
+    monkeypatch.setattr(modules.model, "CURRENT_POINTER", str(tmp_path / "current.json"))
+    monkeypatch.setattr(modules.model, "REGISTRY_PATH", str(tmp_path / "registry.json"))
+    monkeypatch.setattr(modules.model, "INFERENCE_RUNTIME", "numpy")
+    # Startup creates the database and shutdown flushes prediction statistics
+    monkeypatch.setattr(modules.db, "DB_PATH", str(tmp_path / "corrections.db"))
+    monkeypatch.setattr(mnistlib.pack, "PACK_PATH", str(tmp_path / "corrections.u8"))
+    monkeypatch.setattr("main.PACK_PATH", mnistlib.pack.PACK_PATH)
+    monkeypatch.setattr(mnist_model, "model", None)
+    monkeypatch.setattr(mnist_model, "version", None)
+    monkeypatch.setattr(mnist_model, "variant", None)
+    prediction_cache.clear()
+    with TestClient(app) as client:
+        yield client
+
+
+def test_not_ready_without_a_model_artifact(client):
+    assert client.get("/health").json() == {"status": "ok", "ready": False, "model_version": None, "model_variant": None}
+
+    response = client.post("/predict", files={"file": ("digit.png", png_bytes(), "image/png")})
+    assert response.status_code == 503
+
+def test_predicts_once_a_model_is_loaded(client, monkeypatch):
+    monkeypatch.setattr(mnist_model, "model", FixedModel())
+    assert client.get("/health").json()["ready"] is True
+
+    response = client.post("/predict", files={"file": ("digit.png", png_bytes(), "image/png")})
+    assert response.status_code == 200
+    assert response.json()["prediction"] == 7
+
+def test_batch_endpoint_accepts_a_stacked_npy_array(client, monkeypatch):
+    monkeypatch.setattr(mnist_model, "model", FixedModel())
+    buf = io.BytesIO()
+    np.save(buf, np.zeros((3, 28, 28), dtype=np.uint8))
+
+    response = client.post("/predict/batch", files=[("files", ("digits.npy", buf.getvalue()))])
+    assert response.status_code == 200
+    assert response.json()["predictions"] == [7, 7, 7]
+
+def wait_for_version(client, version, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if client.get("/health").json()["model_version"] == version:
+            return True
+        time.sleep(0.05)
+    return False
+
+def test_reload_swaps_in_the_published_version(client, tmp_path):
+    publish_bundle(tmp_path, "1")
+    assert client.post("/reload").status_code == 202
+    assert wait_for_version(client, "1")
+
+    publish_bundle(tmp_path, "2")
+    response = client.post("/reload")
+    assert response.status_code == 202
+    assert response.json()["active_version"] == "1"
+    assert wait_for_version(client, "2")
+
+    response = client.post("/predict", files={"file": ("digit.png", png_bytes(), "image/png")})
+    assert response.status_code == 200
+
+def test_reload_keeps_the_current_model_when_no_artifact_exists(client, monkeypatch):
+    model = FixedModel()
+    monkeypatch.setattr(mnist_model, "model", model)
+
+    assert client.post("/reload").status_code == 202
+    time.sleep(0.2)
+    assert mnist_model.model is model
+
+def test_oversized_upload_is_rejected_with_413(client):
+    big = b"\0" * (MAX_UPLOAD_BYTES + 1)
+    response = client.post("/correct", files={"file": ("big.png", big, "image/png")},
+                           data={"true_label": "1", "predicted_label": "2"})
+    assert response.status_code == 413
+
+def test_streamed_upload_is_cut_off_at_the_limit(client):
+    sent = []
+
+    def body():
+        # No Content-Length: the limit is enforced while the body streams in
+        for _ in range(64):
+            sent.append(1)
+            yield b"\0" * 65536
+
+    response = client.post("/predict", content=body(),
+                           headers={"Content-Type": "multipart/form-data; boundary=limit"})
+    assert response.status_code == 413
+
+def test_correction_that_is_not_an_image_is_rejected(client):
+    response = client.post("/correct", files={"file": ("digit.png", b"not an image" * 100, "image/png")},
+                           data={"true_label": "1", "predicted_label": "2"})
+    assert response.status_code == 400
+
+def test_correction_is_packed_and_recorded(client):
+    response = client.post("/correct", files={"file": ("digit.png", png_bytes(), "image/png")},
+                           data={"true_label": "1", "predicted_label": "2"})
+    assert response.status_code == 200
+    correction_writer.flush()
+
+    assert [(row["record"], row["true_label"]) for row in get_corrections()] == [(0, 1)]
+    assert len(open_pack()) == 1
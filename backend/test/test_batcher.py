@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import numpy as np
+import pytest
+from modules.batcher import MicroBatcher
+from modules.executor import Saturated
+
+
+def run_concurrently(batcher, inputs):
+    async def main():
+        batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.submit(x) for x in inputs))
+        finally:
+            await batcher.stop()
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_are_grouped_into_one_call():
+    calls = []
+
+    def predict(batch):
+        calls.append(len(batch))
+        return batch * 2
+
+    batcher = MicroBatcher(predict, max_batch_size=8, max_wait_ms=50)
+    results = run_concurrently(batcher, [np.full(3, i, dtype='float32') for i in range(5)])
+
+    assert calls == [5]
+    for i, result in enumerate(results):
+        assert result.tolist() == [i * 2] * 3
+
+def test_batches_never_exceed_max_batch_size():
+    calls = []
+
+    def predict(batch):
+        calls.append(len(batch))
+        return batch
+
+    batcher = MicroBatcher(predict, max_batch_size=4, max_wait_ms=50)
+    run_concurrently(batcher, [np.zeros(1) for _ in range(10)])
+
+    assert sum(calls) == 10
+    assert max(calls) <= 4
+
+def test_model_errors_are_raised_to_every_caller():
+    def predict(batch):
+        raise ValueError("boom")
+
+    batcher = MicroBatcher(predict, max_batch_size=8, max_wait_ms=10)
+    with pytest.raises(ValueError):
+        run_concurrently(batcher, [np.zeros(1), np.zeros(1)])
+
+def test_stacked_batches_count_against_the_queue_capacity():
+    release = threading.Event()
+
+    def predict(batch):
+        release.wait(5)
+        return batch
+
+    async def main():
+        batcher = MicroBatcher(predict, max_batch_size=8, max_wait_ms=10, max_queue=4)
+        batcher.start()
+        try:
+            running = asyncio.create_task(batcher.run(np.zeros((3, 1))))
+            await asyncio.sleep(0.05)
+            with pytest.raises(Saturated):
+                await batcher.run(np.zeros((2, 1)))
+            full = asyncio.create_task(batcher.run(np.zeros((1, 1))))
+            await asyncio.sleep(0.05)
+            with pytest.raises(Saturated):
+                await batcher.submit(np.zeros(1))
+            release.set()
+            await asyncio.gather(running, full)
+            # Capacity is given back once the batch has run
+            assert (await batcher.run(np.zeros((4, 1)))).shape == (4, 1)
+        finally:
+            await batcher.stop()
+
+    asyncio.run(main())
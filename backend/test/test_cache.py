@@ -0,0 +1,37 @@
+import time
+import numpy as np
+from modules.cache import PredictionCache, image_key
+
+
+def test_identical_images_share_a_key():
+    a = np.zeros((28, 28, 1), dtype=np.uint8)
+    b = np.zeros((28, 28, 1), dtype=np.uint8)
+    assert image_key(a) == image_key(b)
+    b[0, 0] = 1
+    assert image_key(a) != image_key(b)
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(max_size=2, ttl=60)
+    cache.put("v1", b"a", 1)
+    cache.put("v1", b"b", 2)
+    cache.get("v1", b"a")
+    cache.put("v1", b"c", 3)
+
+    assert cache.get("v1", b"a") == 1
+    assert cache.get("v1", b"b") is None
+    assert cache.get("v1", b"c") == 3
+
+def test_entries_expire_after_ttl():
+    cache = PredictionCache(max_size=2, ttl=0.01)
+    cache.put("v1", b"a", 1)
+    time.sleep(0.02)
+    assert cache.get("v1", b"a") is None
+    assert len(cache) == 0
+
+def test_entries_are_scoped_to_the_model_version():
+    cache = PredictionCache(max_size=2, ttl=60)
+    cache.put("v1", b"a", 1)
+    assert cache.get("v2", b"a") is None
+
+    cache.clear()
+    assert cache.get("v1", b"a") is None
@@ -0,0 +1,47 @@
+import os
+import numpy as np
+import dataset
+
+
+def fake_archive(tmp_path):
+    rng = np.random.default_rng(0)
+    arrays = {"x_train": rng.integers(0, 256, (12, 28, 28), dtype=np.uint8), "y_train": np.arange(12) % 10,
+              "x_test": rng.integers(0, 256, (4, 28, 28), dtype=np.uint8), "y_test": np.arange(4)}
+    path = str(tmp_path / "mnist.npz")
+    np.savez(path, **arrays)
+    return path, arrays
+
+
+def test_first_load_materializes_the_arrays(tmp_path, monkeypatch):
+    archive, arrays = fake_archive(tmp_path)
+    monkeypatch.setattr(dataset, "MNIST_ARCHIVES", [archive])
+    monkeypatch.setattr(dataset, "_verified", set())
+    path = str(tmp_path / "mnist")
+
+    (x_train, y_train), (x_test, _) = dataset.load_mnist(path)
+
+    assert isinstance(x_train, np.memmap)
+    assert x_train.shape == (12, 28, 28, 1) and x_train.dtype == np.uint8
+    assert (x_test[..., 0] == arrays["x_test"]).all()
+    assert y_train.tolist() == arrays["y_train"].tolist()
+    assert dataset.is_valid(path)
+
+def test_corrupted_arrays_are_rebuilt(tmp_path, monkeypatch):
+    archive, arrays = fake_archive(tmp_path)
+    monkeypatch.setattr(dataset, "MNIST_ARCHIVES", [archive])
+    monkeypatch.setattr(dataset, "_verified", set())
+    path = str(tmp_path / "mnist")
+    dataset.materialize(path=path)
+
+    # Flip the last pixel of the cached training images, past the .npy header
+    x_path = os.path.join(path, "x_train.npy")
+    with open(x_path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+    assert not dataset.is_valid(path)
+
+    (x_train, _), _ = dataset.load_mnist(path)
+    assert (x_train[..., 0] == arrays["x_train"]).all()
+    assert dataset.is_valid(path)
@@ -0,0 +1,203 @@
+import sqlite3
+import numpy as np
+import pytest
+import modules.db
+from modules.db import CorrectionWriter, init_db, get_corrections, count_unprocessed, get_connection
+from mnistlib import corrections
+from mnistlib.pack import open_pack
+from modules.executor import Saturated
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "corrections.db")
+    monkeypatch.setattr(modules.db, "DB_PATH", path)
+    init_db()
+    return path
+
+
+def test_database_uses_wal_mode(db_path):
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
+
+def test_queued_corrections_are_committed_by_the_writer(db_path):
+    writer = CorrectionWriter()
+    writer.start()
+    for i in range(10):
+        writer.submit((f"image_{i}.png", None, i % 10, 0))
+    writer.flush()
+    writer.stop()
+
+    rows = get_corrections(processed_status=False)
+    assert [row["image_path"] for row in rows] == [f"image_{i}.png" for i in range(10)]
+
+    corrections.mark_processed(get_connection(), rows[3]["id"])
+    assert len(get_corrections(processed_status=False)) == 6
+
+def test_submit_fails_fast_when_the_queue_is_full(db_path):
+    writer = CorrectionWriter(max_queue=1)
+    writer.submit(("a.png", None, 1, 0))
+    with pytest.raises(Saturated):
+        writer.submit(("b.png", None, 1, 0))
+
+    # Stopping drains what was accepted
+    writer.start()
+    writer.stop()
+    assert len(get_corrections()) == 1
+
+def insert(db_path, count):
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO corrections (image_path, true_label, predicted_label) VALUES (?, ?, ?)",
+                     [(f"image_{i}.png", i % 10, 0) for i in range(count)])
+    conn.commit()
+    conn.close()
+
+def test_unprocessed_count_reads_the_counter_not_the_table(db_path):
+    insert(db_path, 5)
+    assert count_unprocessed() == 5
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE correction_stats SET unprocessed = 42")
+    conn.commit()
+    conn.close()
+    assert count_unprocessed() == 42
+
+def test_watermark_is_found_through_the_processed_index(db_path):
+    insert(db_path, 5)
+    conn = sqlite3.connect(db_path)
+    assert corrections.pending(conn) == (5, 5)
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT MAX(id) FROM corrections WHERE processed = 0").fetchall()
+    conn.close()
+    assert "idx_corrections_processed" in str(plan)
+
+def test_rows_arriving_after_the_watermark_are_neither_loaded_nor_marked(db_path):
+    insert(db_path, 3)
+    conn = sqlite3.connect(db_path)
+    corrections.mark_processed(conn, 1)
+    assert corrections.pending(conn) == (2, 3)
+
+    # Committed by the backend while the flow trains
+    insert(db_path, 2)
+    assert [row["id"] for row in corrections.load(conn, 3)] == [1, 2, 3]
+    assert corrections.mark_processed(conn, 3) == 2
+    assert corrections.pending(conn) == (2, 5)
+    conn.close()
+
+def test_without_a_watermark_only_processed_rows_are_loaded(db_path):
+    insert(db_path, 2)
+    conn = sqlite3.connect(db_path)
+    corrections.mark_processed(conn, 1)
+    assert [row["id"] for row in corrections.load(conn, None)] == [1]
+    conn.close()
+
+def test_unprocessed_counter_follows_inserts_updates_and_deletes(db_path):
+    insert(db_path, 5)
+    corrections.mark_processed(get_connection(), 2)
+    conn = sqlite3.connect(db_path)
+    conn.execute("DELETE FROM corrections WHERE id IN (1, 5)")
+    conn.execute("UPDATE corrections SET processed = 0 WHERE id = 2")
+    conn.commit()
+    conn.close()
+
+    assert count_unprocessed() == 3
+
+def test_unprocessed_counter_is_seeded_from_an_existing_database(tmp_path, monkeypatch):
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE corrections (id INTEGER PRIMARY KEY AUTOINCREMENT, image_path TEXT NOT NULL, "
+                 "true_label INTEGER NOT NULL, predicted_label INTEGER NOT NULL, processed BOOLEAN DEFAULT 0, "
+                 "timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+    conn.executemany("INSERT INTO corrections (image_path, true_label, predicted_label, processed) VALUES (?, 1, 0, ?)",
+                     [("a.png", 0), ("b.png", 1), ("c.png", 0)])
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(modules.db, "DB_PATH", path)
+
+    init_db()
+    init_db()
+    assert count_unprocessed() == 2
+    assert corrections.backlog(get_connection()) == (2, 3, 0)
+
+def test_writer_reports_the_unprocessed_count_after_each_commit(db_path):
+    counts = []
+    writer = CorrectionWriter(on_commit=counts.append)
+    writer.start()
+    for i in range(3):
+        writer.submit((f"image_{i}.png", None, 1, 0))
+        writer.flush()
+    writer.stop()
+
+    assert counts == [(1, 1, 0), (2, 2, 0), (3, 3, 0)]
+
+def test_writer_appends_queued_images_to_the_pack(db_path, tmp_path):
+    pack_path = str(tmp_path / "corrections.u8")
+    writer = CorrectionWriter()
+    writer.submit((pack_path, np.full((28, 28, 1), 5, dtype=np.uint8), 5, 3))
+    writer.submit(("legacy.png", None, 1, 0))
+    writer.submit((pack_path, np.full((28, 28, 1), 9, dtype=np.uint8), 9, 4))
+    writer.start()
+    writer.stop()
+
+    assert [(row["image_path"], row["record"]) for row in get_corrections()] == \
+        [(pack_path, 0), ("legacy.png", None), (pack_path, 1)]
+    assert open_pack(pack_path)[:, 0, 0].tolist() == [5, 9]
+
+def test_rejected_correction_leaves_nothing_in_the_pack(db_path, tmp_path):
+    pack_path = str(tmp_path / "corrections.u8")
+    writer = CorrectionWriter(max_queue=1)
+    writer.submit((pack_path, np.zeros((28, 28, 1), dtype=np.uint8), 1, 0))
+    with pytest.raises(Saturated):
+        writer.submit((pack_path, np.zeros((28, 28, 1), dtype=np.uint8), 2, 0))
+    writer.start()
+    writer.stop()
+
+    assert len(open_pack(pack_path)) == 1
+
+def test_backlog_counts_new_corrections_since_an_unsuccessful_run(db_path):
+    insert(db_path, 8)
+    conn = sqlite3.connect(db_path)
+    corrections.record_run(conn, 8, published=False)
+    assert corrections.backlog(conn) == (8, 0, 1)
+
+    insert(db_path, 3)
+    assert corrections.backlog(conn) == (11, 3, 1)
+    corrections.record_run(conn, 11, published=True)
+    assert corrections.backlog(conn) == (11, 0, 0)
+
+def test_a_run_that_does_not_train_keeps_the_backoff(db_path):
+    insert(db_path, 8)
+    conn = sqlite3.connect(db_path)
+    corrections.record_run(conn, 8, published=False)
+    insert(db_path, 6)
+    corrections.record_run(conn, 14)
+    assert corrections.backlog(conn) == (14, 0, 1)
+    conn.close()
+
+def test_corrections_since_the_last_run_are_counted_by_triggers(db_path):
+    insert(db_path, 5)
+    conn = sqlite3.connect(db_path)
+    corrections.record_run(conn, 3, published=False)
+    insert(db_path, 2)
+    conn.execute("DELETE FROM corrections WHERE id IN (2, 6)")
+    conn.commit()
+    assert corrections.backlog(conn) == (5, 3, 1)
+
+    conn.execute("UPDATE correction_stats SET since_evaluated = 42")
+    conn.commit()
+    assert corrections.backlog(conn)[1] == 42
+    conn.close()
+
+def test_count_since_the_last_run_is_seeded_on_migration(db_path):
+    insert(db_path, 4)
+    conn = sqlite3.connect(db_path)
+    corrections.record_run(conn, 1, published=False)
+    # As created before the count existed
+    conn.execute("DROP TRIGGER corrections_new_insert")
+    conn.execute("DROP TRIGGER corrections_new_delete")
+    conn.execute("ALTER TABLE correction_stats DROP COLUMN since_evaluated")
+    conn.commit()
+
+    init_db()
+    assert corrections.backlog(conn) == (4, 3, 1)
+    conn.close()
@@ -0,0 +1,28 @@
+import asyncio
+import threading
+import pytest
+from modules.executor import BoundedExecutor, Saturated
+
+
+def test_run_returns_the_function_result():
+    pool = BoundedExecutor("test", max_workers=1, max_queue=0)
+    assert asyncio.run(pool.run(pow, 3, 2)) == 9
+    pool.shutdown()
+
+def test_rejects_work_beyond_capacity():
+    pool = BoundedExecutor("test", max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def main():
+        running = [asyncio.create_task(pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(Saturated):
+            await pool.run(release.wait)
+        release.set()
+        await asyncio.gather(*running)
+        # Slots are given back once work completes
+        assert pool.pending == 0
+        assert await pool.run(pow, 2, 2) == 4
+
+    asyncio.run(main())
+    pool.shutdown()
@@ -0,0 +1,107 @@
+import json
+import os
+import sqlite3
+import numpy as np
+import pytest
+from prefect.logging import disable_run_logger
+import flow
+import modules.db
+from mnistlib import drift
+from mnistlib.model import build_model
+from modules.db import init_db
+
+
+def one_hot(classes):
+    probs = np.full((len(classes), 10), 0.01 / 9)
+    probs[np.arange(len(classes)), classes] = 0.99
+    return probs
+
+
+def test_legacy_deployment_gets_a_reference_and_a_verdict(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "corrections.db")
+    monkeypatch.setattr(modules.db, "DB_PATH", db_path)
+    init_db()
+    summary = drift.to_json(drift.summarize(one_hot(np.arange(600) % 10)))
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO prediction_stats (model_version, window_seconds, predictions, low_confidence, "
+                 "low_confidence_rate, summary) VALUES ('legacy', 60, ?, 0, 0, ?)",
+                 (summary["count"], json.dumps({field: summary[field] for field in drift.FIELDS})))
+    conn.commit()
+    conn.close()
+
+    # An unversioned model and no model directory, as deployed before versioning
+    model_path = str(tmp_path / "mnist_model.h5")
+    build_model().save(model_path)
+    model_dir = str(tmp_path / "models")
+    x_test = np.zeros((20, 28, 28, 1), dtype=np.uint8)
+    monkeypatch.setattr(flow, "DB_PATH", db_path)
+    monkeypatch.setattr(flow, "MODEL_PATH", model_path)
+    monkeypatch.setattr(flow, "MODEL_DIR", model_dir)
+    monkeypatch.setattr(flow, "CURRENT_POINTER", os.path.join(model_dir, "current.json"))
+    monkeypatch.setattr(flow, "load_mnist", lambda: ((x_test, np.zeros(20)), (x_test, np.arange(20) % 10)))
+
+    with disable_run_logger():
+        assert flow.check_drift.fn() in (True, False)
+    assert os.path.exists(flow.reference_path("legacy"))
+
+
+def patch_tasks(monkeypatch, unprocessed, drifted, published=True, model_exists=True):
+    """Replaces the flow's tasks with fakes, returning the list of calls they record."""
+    calls = []
+    max_id = unprocessed or None
+    monkeypatch.setattr(flow, "model_exists", lambda: model_exists)
+    monkeypatch.setattr(flow, "check_corrections", lambda: (unprocessed, max_id))
+    monkeypatch.setattr(flow, "check_drift", lambda: drifted)
+    monkeypatch.setattr(flow, "load_corrections", lambda up_to_id: up_to_id)
+
+    def retrain_model(up_to_id):
+        calls.append(("retrain", up_to_id))
+        return published
+
+    monkeypatch.setattr(flow, "retrain_model", retrain_model)
+    monkeypatch.setattr(flow, "notify_backend", lambda: calls.append(("notify",)))
+    monkeypatch.setattr(flow, "mark_processed", lambda up_to_id: calls.append(("mark", up_to_id)))
+    monkeypatch.setattr(flow, "record_run", lambda up_to_id, published=None: calls.append(("record", up_to_id, published)))
+    return calls
+
+
+def run_flow():
+    with disable_run_logger():
+        flow.mnist_retraining_flow.fn()
+
+
+@pytest.mark.parametrize("unprocessed, drifted, published, expected", [
+    # Threshold crossed but the traffic has not shifted: the verdict is recorded, nothing trained
+    (8, False, True, [("record", 8, None)]),
+    # No verdict: the count alone decides
+    (8, None, True, [("retrain", 8), ("notify",), ("mark", 8), ("record", 8, True)]),
+    # Shifted traffic retrains on any new correction
+    (2, True, True, [("retrain", 2), ("notify",), ("mark", 2), ("record", 2, True)]),
+    # A rejected candidate leaves the corrections unprocessed
+    (8, None, False, [("retrain", 8), ("record", 8, False)]),
+    # Under the threshold without a shift: nothing to train, the corrections seen are recorded
+    (2, False, True, [("record", 2, None)]),
+    # A shift without corrections only raises an alert, with no watermark to record
+    (0, True, True, [("record", None, None)]),
+])
+def test_flow_retrains_only_when_the_corrections_are_worth_it(monkeypatch, unprocessed, drifted, published, expected):
+    calls = patch_tasks(monkeypatch, unprocessed, drifted, published)
+    run_flow()
+    assert calls == expected
+
+def test_initial_training_is_recorded(monkeypatch):
+    calls = patch_tasks(monkeypatch, 3, None, model_exists=False)
+    run_flow()
+    assert calls == [("retrain", 3), ("notify",), ("mark", 3), ("record", 3, True)]
+
+@pytest.mark.parametrize("failing", ["check_drift", "retrain_model"])
+def test_a_run_that_raises_is_recorded_as_unsuccessful(monkeypatch, failing):
+    calls = patch_tasks(monkeypatch, 8, None)
+
+    def fail(*args):
+        raise RuntimeError("out of memory")
+
+    monkeypatch.setattr(flow, failing, fail)
+    with pytest.raises(RuntimeError):
+        run_flow()
+    assert calls == [("record", 8, False)]
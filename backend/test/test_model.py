@@ -0,0 +1,100 @@
+import asyncio
+import io
+import json
+import numpy as np
+from PIL import Image
+import modules.model
+from modules.model import MNISTModel, select_variant
+
+
+def encode(img, fmt="PNG"):
+    buf = io.BytesIO()
+    img.save(buf, format=fmt)
+    return buf.getvalue()
+
+
+def test_raw_buffer_is_used_without_decoding():
+    pixels = np.arange(784, dtype=np.uint8).reshape(28, 28)
+    result = MNISTModel().preprocess(pixels.tobytes())
+
+    assert result.shape == (28, 28, 1)
+    assert result.dtype == np.uint8
+    assert (result[..., 0] == pixels).all()
+
+def test_npy_payload_matches_raw_pixels():
+    pixels = np.arange(784, dtype=np.uint8).reshape(28, 28)
+    buf = io.BytesIO()
+    np.save(buf, pixels)
+
+    assert (MNISTModel().preprocess(buf.getvalue())[..., 0] == pixels).all()
+
+def test_large_canvas_is_downscaled_to_28x28():
+    canvas = Image.new('RGBA', (280, 280), color=(255, 255, 255, 255))
+    result = MNISTModel().preprocess(encode(canvas))
+
+    assert result.shape == (28, 28, 1)
+    assert (result == 255).all()
+
+def test_small_png_is_decoded_unchanged():
+    pixels = np.arange(784, dtype=np.uint8).reshape(28, 28)
+    result = MNISTModel().preprocess(encode(Image.fromarray(pixels)))
+
+    assert (result[..., 0] == pixels).all()
+
+def write_registry(tmp_path, monkeypatch):
+    registry = {"v1": {
+        "float32": {"format": "keras", "path": "m.h5", "accuracy": 0.991, "latency_ms": 1.2},
+        "float16": {"format": "tflite", "path": "m-float16.tflite", "accuracy": 0.990, "latency_ms": 0.4},
+        "int8": {"format": "tflite", "path": "m-int8.tflite", "accuracy": 0.975, "latency_ms": 0.2},
+    }}
+    (tmp_path / "registry.json").write_text(json.dumps(registry))
+    monkeypatch.setattr(modules.model, "REGISTRY_PATH", str(tmp_path / "registry.json"))
+
+def test_fastest_variant_above_the_accuracy_floor_is_selected(tmp_path, monkeypatch):
+    write_registry(tmp_path, monkeypatch)
+    monkeypatch.setattr(modules.model, "MIN_ACCURACY", 0.98)
+    assert select_variant("v1")[0] == "float16"
+
+    monkeypatch.setattr(modules.model, "MIN_ACCURACY", 0.995)
+    assert select_variant("v1") == ("float32", None)
+
+def test_forced_variant_and_unregistered_versions(tmp_path, monkeypatch):
+    write_registry(tmp_path, monkeypatch)
+    monkeypatch.setattr(modules.model, "MODEL_VARIANT", "int8")
+    assert select_variant("v1")[1]["path"] == "m-int8.tflite"
+    assert select_variant("v2") == ("float32", None)
+
+def test_numpy_runtime_never_serves_tflite_through_tensorflow(tmp_path, monkeypatch):
+    write_registry(tmp_path, monkeypatch)
+    monkeypatch.setattr(modules.model, "INFERENCE_RUNTIME", "numpy")
+    monkeypatch.setattr(modules.model, "standalone_interpreter_available", lambda: False)
+    assert select_variant("v1") == ("float32", None)
+
+    # With LiteRT installed, only TFLite variants compete: the registered
+    # float32 latency was measured with Keras, not the NumPy runtime
+    monkeypatch.setattr(modules.model, "standalone_interpreter_available", lambda: True)
+    monkeypatch.setattr(modules.model, "MIN_ACCURACY", 0.995)
+    assert select_variant("v1") == ("float32", None)
+    monkeypatch.setattr(modules.model, "MIN_ACCURACY", 0.98)
+    assert select_variant("v1")[0] == "float16"
+
+def test_watch_keeps_polling_after_a_load_error(monkeypatch):
+    model, calls = MNISTModel(), []
+
+    def load():
+        calls.append(1)
+        if len(calls) == 1:
+            raise KeyError("accuracy")
+        model.model = object()
+        return True
+
+    monkeypatch.setattr(model, "load", load)
+    monkeypatch.setattr(modules.model, "MODEL_POLL_INTERVAL", 0.01)
+
+    async def watch_briefly():
+        task = asyncio.create_task(model.watch())
+        await asyncio.sleep(0.2)
+        task.cancel()
+
+    asyncio.run(watch_briefly())
+    assert len(calls) == 2 and model.ready
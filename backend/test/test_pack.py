@@ -0,0 +1,22 @@
+import numpy as np
+from mnistlib.pack import append_image, open_pack, RECORD_SIZE
+
+
+def test_appended_images_are_read_back_by_record(tmp_path):
+    path = str(tmp_path / "corrections.u8")
+    images = [np.full((28, 28, 1), i, dtype=np.uint8) for i in range(3)]
+    assert [append_image(img, path) for img in images] == [0, 1, 2]
+
+    pack = open_pack(path)
+    assert pack.shape == (3, 28, 28)
+    assert (pack[[2, 0]] == np.array([2, 0], dtype=np.uint8)[:, None, None]).all()
+
+def test_truncated_tail_is_dropped_before_appending(tmp_path):
+    path = tmp_path / "corrections.u8"
+    path.write_bytes(b"\x01" * (RECORD_SIZE + 10))
+
+    assert append_image(np.zeros((28, 28), dtype=np.uint8), str(path)) == 1
+    assert path.stat().st_size == 2 * RECORD_SIZE
+
+def test_missing_pack_is_empty(tmp_path):
+    assert open_pack(str(tmp_path / "missing.u8")).shape == (0, 28, 28)
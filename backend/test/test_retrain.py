@@ -0,0 +1,80 @@
+import json
+import httpx
+from modules.retrain import RetrainTrigger, TRIGGER_TAG
+
+
+def prefect_api(active=0, queued=0):
+    """A fake Prefect API recording the flow runs created."""
+    created = []
+
+    def handler(request):
+        if request.url.path == "/api/deployments/name/flow/deployment":
+            return httpx.Response(200, json={"id": "dep-1"})
+        if request.url.path == "/api/flow_runs/count":
+            body = json.loads(request.content)
+            return httpx.Response(200, json=queued if "tags" in body["flow_runs"] else active)
+        if request.url.path == "/api/deployments/dep-1/create_flow_run":
+            created.append(json.loads(request.content))
+            return httpx.Response(201, json={"id": f"run-{len(created)}"})
+        return httpx.Response(404)
+
+    client = httpx.Client(base_url="http://prefect/api", transport=httpx.MockTransport(handler))
+    return client, created
+
+
+def make_trigger(**kwargs):
+    return RetrainTrigger(api_url="http://prefect/api", deployment="flow/deployment", **kwargs)
+
+
+def test_a_run_is_created_when_none_is_active():
+    client, created = prefect_api()
+    assert make_trigger().trigger(client, "10 unprocessed corrections") == "run-1"
+    assert created == [{"tags": [TRIGGER_TAG]}]
+
+def test_no_run_is_created_while_one_is_running_or_queued():
+    for active, queued in ((1, 0), (0, 1)):
+        client, created = prefect_api(active=active, queued=queued)
+        assert make_trigger().trigger(client, "10 unprocessed corrections") is None
+        assert created == []
+
+def test_notify_fires_above_the_threshold_once_per_debounce_window(monkeypatch):
+    trigger = make_trigger(threshold=5, debounce=60)
+    now, calls = [0.0], []
+
+    def fake_trigger(reason):
+        calls.append(reason)
+        trigger._busy = False
+
+    monkeypatch.setattr("modules.retrain.time.monotonic", lambda: now[0])
+    monkeypatch.setattr(trigger, "_trigger", fake_trigger)
+    monkeypatch.setattr("threading.Thread.start", lambda thread: thread.run())
+
+    for count in (3, 5, 6, 7):
+        trigger.notify((count, count, 0))
+    now[0] = 61
+    trigger.notify((8, 8, 0))
+    assert calls == ["6 unprocessed corrections (> 5)", "8 unprocessed corrections (> 5)"]
+
+def test_new_corrections_required_double_after_each_run_without_a_model(monkeypatch):
+    trigger = make_trigger(threshold=5, debounce=0)
+    calls = []
+    monkeypatch.setattr(trigger, "request", calls.append)
+
+    # A candidate was rejected: nothing until 6 new corrections, then 12 after a second rejection
+    trigger.notify((20, 5, 1))
+    trigger.notify((20, 11, 2))
+    assert calls == []
+    trigger.notify((21, 6, 1))
+    trigger.notify((30, 12, 2))
+    assert len(calls) == 2
+
+def test_nothing_is_requested_again_without_corrections_since_the_last_run(monkeypatch):
+    trigger = make_trigger(threshold=5, debounce=0)
+    calls = []
+    monkeypatch.setattr(trigger, "request", calls.append)
+
+    # The flow saw all 20 corrections and found no distribution shift
+    trigger.notify((20, 0, 0))
+    assert calls == []
+    trigger.notify((21, 1, 0))
+    assert len(calls) == 1
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from mnistlib.model import build_model, export_numpy_bundle
+from modules.runtime import NumpyCNN
+
+
+def build_keras_model():
+    pytest.importorskip("tensorflow")
+    return build_model()
+
+
+def test_numpy_bundle_matches_keras_predictions(tmp_path):
+    model = build_keras_model()
+    export_numpy_bundle(model, str(tmp_path))
+    x = np.random.default_rng(0).random((8, 28, 28, 1), dtype=np.float32)
+
+    expected = np.asarray(model.predict_on_batch(x))
+    actual = NumpyCNN.load(str(tmp_path)).predict_on_batch(x)
+
+    np.testing.assert_allclose(actual, expected, atol=1e-5)
+
+    mapped = NumpyCNN.load(str(tmp_path), mmap=True).predict_on_batch(x)
+    np.testing.assert_allclose(mapped, expected, atol=1e-5)
+
+def test_rejects_unknown_bundle_format(tmp_path):
+    (tmp_path / "manifest.json").write_text('{"format": "other", "shapes": []}')
+    with pytest.raises(ValueError):
+        NumpyCNN.load(str(tmp_path))
+
+
+def test_tflite_variants_match_keras_predictions():
+    pytest.importorskip("tensorflow")
+    from mnistlib.variants import convert_tflite
+    from mnistlib.tflite import TFLiteModel
+    model = build_keras_model()
+    x = np.random.default_rng(0).random((8, 28, 28, 1), dtype=np.float32)
+    expected = np.asarray(model.predict_on_batch(x))
+
+    float16 = TFLiteModel(model_content=convert_tflite(model, "float16"))
+    np.testing.assert_allclose(float16.predict_on_batch(x), expected, atol=1e-2)
+
+    int8 = TFLiteModel(model_content=convert_tflite(model, "int8", calibration=x))
+    assert int8.predict_on_batch(x[:3]).shape == (3, 10)
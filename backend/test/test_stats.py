@@ -0,0 +1,86 @@
+import json
+import sqlite3
+import numpy as np
+import pytest
+import modules.db
+import modules.stats
+from mnistlib import corrections, drift
+from modules.db import init_db
+from modules.stats import PredictionStats
+
+
+def one_hot(classes, confidence=0.99):
+    probs = np.full((len(classes), 10), (1 - confidence) / 9)
+    probs[np.arange(len(classes)), classes] = confidence
+    return probs
+
+
+def test_summary_counts_classes_and_low_confidence():
+    summary = drift.summarize(np.vstack([one_hot([3, 3, 7]), np.full((1, 10), 0.1)]))
+
+    assert summary["count"] == 4
+    assert summary["classes"][[0, 3, 7]].tolist() == [1, 2, 1]
+    assert summary["low_confidence"] == 1
+    # The uniform prediction has the highest possible entropy
+    assert summary["entropy"][-1] == 1
+    assert summary["confidence"].sum() == summary["entropy"].sum() == 4
+
+def test_psi_separates_a_shifted_distribution():
+    rng = np.random.default_rng(0)
+    reference = drift.summarize(one_hot(rng.integers(0, 10, 5000)))
+    same = drift.summarize(one_hot(rng.integers(0, 10, 2000)))
+    # Most of the traffic suddenly predicted as a single digit
+    shifted = drift.summarize(one_hot(np.where(rng.random(2000) < 0.5, 1, rng.integers(0, 10, 2000))))
+
+    assert drift.psi(reference["classes"], same["classes"]) < 0.1
+    assert drift.psi(reference["classes"], shifted["classes"]) > 0.2
+
+def test_rolling_rate_does_not_depend_on_batching():
+    probs = np.vstack([one_hot([1] * 50), np.full((50, 10), 0.1)])
+    single, batched = PredictionStats(alpha=0.05), PredictionStats(alpha=0.05)
+    for row in probs:
+        single.observe("v1", row)
+    batched.observe("v1", probs[:50])
+    batched.observe("v1", probs[50:])
+
+    assert batched.low_confidence_rate == pytest.approx(single.low_confidence_rate)
+
+def test_flush_writes_one_row_per_model_version(tmp_path, monkeypatch):
+    monkeypatch.setattr(modules.db, "DB_PATH", str(tmp_path / "corrections.db"))
+    init_db()
+    stats = PredictionStats()
+    stats.observe("v1", one_hot([1, 2]))
+    stats.observe("v2", one_hot([3]))
+
+    assert stats.flush() == 3
+    assert stats.flush() == 0
+    conn = sqlite3.connect(modules.db.DB_PATH)
+    rows = conn.execute("SELECT model_version, predictions, summary FROM prediction_stats ORDER BY id").fetchall()
+    conn.close()
+    assert [(version, count) for version, count, _ in rows] == [("v1", 2), ("v2", 1)]
+    assert json.loads(rows[0][2])["classes"] == [0, 1, 1, 0, 0, 0, 0, 0, 0, 0]
+
+def test_low_confidence_requests_a_run_only_for_new_corrections(tmp_path, monkeypatch):
+    monkeypatch.setattr(modules.db, "DB_PATH", str(tmp_path / "corrections.db"))
+    init_db()
+    calls = []
+    monkeypatch.setattr(modules.stats.retrain_trigger, "request", calls.append)
+    stats = PredictionStats()
+    stats.low_confidence_rate = 0.9
+    conn = sqlite3.connect(modules.db.DB_PATH)
+
+    def correct(count):
+        conn.executemany("INSERT INTO corrections (image_path, true_label, predicted_label) VALUES ('x.png', 1, 2)",
+                         [()] * count)
+        conn.commit()
+
+    stats.check()
+    correct(2)
+    stats.check()
+    # The flow looked at both corrections and found no distribution shift
+    corrections.record_run(conn, 2)
+    stats.check()
+    correct(1)
+    stats.check()
+    conn.close()
+    assert len(calls) == 2
@@ -1,10 +1,62 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from loguru import logger
 from streamlit_drawable_canvas import st_canvas
 from PIL import Image
 import numpy as np
+import hashlib
 import io
+import os
+
+BACKEND_URL = os.getenv("BACKEND_URL", "http://backend:8000")
+# (connect, read) in seconds
+BACKEND_TIMEOUT = (float(os.getenv("BACKEND_CONNECT_TIMEOUT", "2")), float(os.getenv("BACKEND_READ_TIMEOUT", "10")))
+BACKEND_RETRIES = int(os.getenv("BACKEND_RETRIES", "3"))
+# A raw payload starting like an encoded image would be decoded as one by the backend
+IMAGE_SIGNATURES = (b"\x89PNG", b"\xff\xd8", b"GIF8")
+
+
+@st.cache_resource
+def backend_session():
+    """Keep-alive session shared by every user session and rerun of the script."""
+    session = requests.Session()
+    # Only failed connections and 503 (backend saturated, nothing was done)
+    # are retried, so a correction is never recorded twice
+    retry = Retry(total=BACKEND_RETRIES, connect=BACKEND_RETRIES, read=0, status=BACKEND_RETRIES,
+                  status_forcelist=(503,), allowed_methods=None, backoff_factor=0.2,
+                  respect_retry_after_header=True, raise_on_status=False)
+    session.mount("http://", HTTPAdapter(max_retries=retry, pool_maxsize=int(os.getenv("BACKEND_POOL_SIZE", "10"))))
+    return session
+
+
+def canvas_payload(image_data):
+    """The canvas as a 28x28 grayscale image, in the format the backend decodes the fastest.
+
+    Same pixels as the PNG the backend used to receive, sent as 784 raw bytes.
+    """
+    img = Image.fromarray(image_data.astype("uint8"), "RGBA")
+    img = img.convert("L")  # Convert to grayscale
+    img = img.resize((28, 28))  # Resize to 28x28 (MNIST size)
+    pixels = np.asarray(img, dtype=np.uint8)
+    raw = pixels.tobytes()
+    if raw.startswith(IMAGE_SIGNATURES):
+        buffer = io.BytesIO()
+        np.save(buffer, pixels)
+        return "canvas.npy", buffer.getvalue()
+    return "canvas.u8", raw
+
+
+def show_result(prediction, probabilities):
+    with col2:
+        st.subheader("Résultats")
+        st.success(f"Prédiction: **{prediction}**")
+
+        # Show probabilities
+        if probabilities:
+            st.bar_chart(probabilities)
+
 
 st.set_page_config(page_title="Reconnaissance de nombre", page_icon="🔢")
 
@@ -28,8 +80,6 @@ with col1:
         key="canvas",
     )
 
-prediction_state = st.session_state.get('prediction_state', None)
-last_image_bytes = st.session_state.get('last_image_bytes', None)
 
 if canvas_result.image_data is not None:
     # Check if the canvas is not empty (has some drawing)
@@ -40,36 +90,26 @@ if canvas_result.image_data is not None:
     if st.button("Prédire"):
         try:
             # Prepare image for API
-            img = Image.fromarray(canvas_result.image_data.astype("uint8"), "RGBA")
-            img = img.convert("L")  # Convert to grayscale
-            img = img.resize((28, 28))  # Resize to 28x28 (MNIST size)
-            
-            # Save to bytes
-            img_bytes_io = io.BytesIO()
-            img.save(img_bytes_io, format="PNG")
-            img_bytes = img_bytes_io.getvalue()
-            
-            # Store for correction
-            st.session_state['last_image_bytes'] = img_bytes
-
-            # Call API
-            files = {"file": ("canvas.png", img_bytes, "image/png")}
-            response = requests.post("http://backend:8000/predict", files=files)
-            response.raise_for_status()
-            
-            result = response.json()
-            prediction = result.get("prediction")
-            probabilities = result.get("probabilities")
-            
-            st.session_state['prediction_state'] = prediction
-            
-            with col2:
-                st.subheader("Résultats")
-                st.success(f"Prédiction: **{prediction}**")
-                
-                # Show probabilities
-                if probabilities:
-                    st.bar_chart(probabilities)
+            filename, img_bytes = canvas_payload(canvas_result.image_data)
+            img_hash = hashlib.blake2b(img_bytes, digest_size=16).hexdigest()
+
+            # Same drawing as the last prediction: reuse its result
+            if img_hash != st.session_state.get('last_image_hash'):
+                files = {"file": (filename, img_bytes, "application/octet-stream")}
+                response = backend_session().post(f"{BACKEND_URL}/predict", files=files, timeout=BACKEND_TIMEOUT)
+                response.raise_for_status()
+                result = response.json()
+                if "prediction" not in result:
+                    raise RuntimeError(result.get("error", "No prediction returned"))
+
+                # Store for correction
+                st.session_state['last_image_bytes'] = (filename, img_bytes)
+                st.session_state['last_image_hash'] = img_hash
+                st.session_state['last_result'] = result
+
+            result = st.session_state['last_result']
+            st.session_state['prediction_state'] = result.get("prediction")
+            show_result(result.get("prediction"), result.get("probabilities"))
 
         except Exception as e:
             st.error(f"Error connecting to backend: {e}")
@@ -86,20 +126,23 @@ if st.session_state.get('prediction_state') is not None:
         if st.button("Soumettre la correction"):
             if st.session_state.get('last_image_bytes'):
                 try:
+                    filename, img_bytes = st.session_state['last_image_bytes']
                     files = {
-                        "file": ("correction.png", st.session_state['last_image_bytes'], "image/png")
+                        "file": (filename, img_bytes, "application/octet-stream")
                     }
                     data = {
                         "true_label": correct_label,
                         "predicted_label": st.session_state['prediction_state']
                     }
                     
-                    response = requests.post("http://backend:8000/correct", files=files, data=data)
+                    response = backend_session().post(f"{BACKEND_URL}/correct", files=files, data=data,
+                                                      timeout=BACKEND_TIMEOUT)
                     if response.status_code == 200:
                         st.success("Thank you! The model will learn from this mistake.")
                         # Clear state
                         st.session_state['prediction_state'] = None
                         st.session_state['last_image_bytes'] = None
+                        st.session_state['last_image_hash'] = None
                     else:
                         st.error("Failed to submit correction.")
                 except Exception as e:
@@ -0,0 +1,5 @@
+"""Code shared by the backend and the Prefect training flow.
+
+`model` and `preprocessing` only need NumPy and Pillow, so the backend can
+import them without loading TensorFlow; `training` requires TensorFlow.
+"""
@@ -0,0 +1,65 @@
+"""Queries on the corrections table shared by the backend and the training flow.
+
+Corrections are processed by watermark: the flow reads the highest
+unprocessed id when it starts, trains on the rows up to it and marks exactly
+those, so rows that arrive during a run wait for the next one. The last id
+each run considered is recorded in correction_stats, so the backend waits
+for new corrections before asking for another.
+"""
+import sqlite3
+
+COLUMNS = "id, image_path, record, true_label, processed"
+
+
+def count_unprocessed(conn):
+    try:
+        return conn.execute("SELECT unprocessed FROM correction_stats WHERE id = 1").fetchone()[0]
+    except (sqlite3.OperationalError, TypeError):
+        # Database created before the counter existed; the backend adds it at startup
+        return conn.execute("SELECT COUNT(*) FROM corrections WHERE processed = 0").fetchone()[0]
+
+
+def pending(conn):
+    """Returns (unprocessed count, highest unprocessed id), the id being None when there is none.
+
+    The count comes from the trigger-maintained counter, the id from one seek
+    on the (processed, id) index.
+    """
+    max_id = conn.execute("SELECT MAX(id) FROM corrections WHERE processed = 0").fetchone()[0]
+    return count_unprocessed(conn), max_id
+
+
+def load(conn, up_to_id):
+    """Processed rows, and unprocessed rows up to the watermark, oldest first."""
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    return cursor.execute(f"SELECT {COLUMNS} FROM corrections WHERE processed = 1 OR id <= ? ORDER BY id",
+                          (-1 if up_to_id is None else up_to_id,)).fetchall()
+
+
+def mark_processed(conn, up_to_id):
+    """Marks every unprocessed row up to and including the watermark. Returns the number marked."""
+    cursor = conn.execute("UPDATE corrections SET processed = 1 WHERE processed = 0 AND id <= ?", (up_to_id,))
+    conn.commit()
+    return cursor.rowcount
+
+
+def backlog(conn):
+    """Returns (unprocessed count, corrections since the last run, runs in a row that published nothing)."""
+    return tuple(conn.execute(
+        "SELECT unprocessed, since_evaluated, failed_runs FROM correction_stats WHERE id = 1").fetchone())
+
+
+def record_run(conn, up_to_id, published=None):
+    """Records that a run considered the corrections up to `up_to_id`.
+
+    `published` is None when the run decided not to train (no distribution
+    shift), which leaves the count of unsuccessful runs as it is. The rows
+    after the watermark are counted once here, the backend's triggers keep
+    the count from then on.
+    """
+    failed_runs = {None: "failed_runs", True: "0", False: "failed_runs + 1"}[published]
+    conn.execute(f"UPDATE correction_stats SET evaluated_id = ?, failed_runs = {failed_runs}, "
+                 "since_evaluated = (SELECT COUNT(*) FROM corrections WHERE id > ?) WHERE id = 1",
+                 (up_to_id, up_to_id))
+    conn.commit()
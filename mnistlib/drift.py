@@ -0,0 +1,71 @@
+"""Prediction distribution summaries and their comparison, for drift detection.
+
+A summary holds counts only: predicted classes, a confidence histogram (top
+probability) and an entropy histogram, plus the number of low-confidence
+predictions. Summaries add up, so the backend can aggregate live traffic in
+constant memory and the flow can compare it with the test set reference.
+"""
+import os
+import numpy as np
+
+CLASSES = 10
+HISTOGRAM_BINS = 10
+# Entropy ranges from 0 (one-hot) to log(10) (uniform)
+MAX_ENTROPY = float(np.log(CLASSES))
+LOW_CONFIDENCE = float(os.getenv("LOW_CONFIDENCE", "0.8")) # Top probability below this is low confidence
+FIELDS = ("classes", "confidence", "entropy")
+
+
+def empty():
+    return {"count": 0, "low_confidence": 0, "classes": np.zeros(CLASSES, dtype=np.int64),
+            "confidence": np.zeros(HISTOGRAM_BINS, dtype=np.int64),
+            "entropy": np.zeros(HISTOGRAM_BINS, dtype=np.int64)}
+
+
+def bin_index(values, upper):
+    return np.minimum((values / upper * HISTOGRAM_BINS).astype(np.int64), HISTOGRAM_BINS - 1)
+
+
+def summarize(probs):
+    """Summary of a (N, 10) or (10,) array of predicted probabilities."""
+    probs = np.asarray(probs, dtype=np.float64).reshape(-1, CLASSES)
+    confidence = probs.max(axis=1)
+    entropy = -np.sum(probs * np.log(np.clip(probs, 1e-12, 1)), axis=1)
+    return {"count": len(probs), "low_confidence": int(np.sum(confidence < LOW_CONFIDENCE)),
+            "classes": np.bincount(probs.argmax(axis=1), minlength=CLASSES),
+            "confidence": np.bincount(bin_index(confidence, 1.0), minlength=HISTOGRAM_BINS),
+            "entropy": np.bincount(bin_index(np.clip(entropy, 0, MAX_ENTROPY), MAX_ENTROPY),
+                                   minlength=HISTOGRAM_BINS)}
+
+
+def merge(summaries):
+    total = empty()
+    for summary in summaries:
+        total["count"] += summary["count"]
+        total["low_confidence"] += summary["low_confidence"]
+        for field in FIELDS:
+            total[field] = total[field] + np.asarray(summary[field], dtype=np.int64)
+    return total
+
+
+def to_json(summary):
+    return {key: value.tolist() if isinstance(value, np.ndarray) else value for key, value in summary.items()}
+
+
+def psi(expected, actual, eps=1e-4):
+    """Population stability index between two histograms of counts.
+
+    Below 0.1 the distributions are usually considered identical, above 0.2
+    shifted.
+    """
+    expected = np.maximum(np.asarray(expected, dtype=np.float64) / max(np.sum(expected), 1), eps)
+    actual = np.maximum(np.asarray(actual, dtype=np.float64) / max(np.sum(actual), 1), eps)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def compare(reference, live):
+    """PSI of each histogram, and the difference in low-confidence rate."""
+    result = {field: psi(reference[field], live[field]) for field in FIELDS}
+    result["low_confidence_delta"] = (live["low_confidence"] / max(live["count"], 1)
+                                      - reference["low_confidence"] / max(reference["count"], 1))
+    return result
@@ -0,0 +1,49 @@
+import json
+import os
+import numpy as np
+
+BUNDLE_FORMAT = "numpy-cnn-v1"
+
+# Layer sequence of the MNIST CNN, with the number of weight arrays each uses.
+# build_model and the backend's NumPy runtime both follow it.
+ARCHITECTURE = [
+    ("conv_relu", 2),
+    ("maxpool", 0),
+    ("conv_relu", 2),
+    ("maxpool", 0),
+    ("flatten", 0),
+    ("dense_relu", 2),
+    ("dense_softmax", 2),
+]
+
+
+def build_model():
+    """Returns the uncompiled Keras CNN served by the backend."""
+    from tensorflow import keras
+    from tensorflow.keras.layers import Dense, Conv2D, Flatten, MaxPooling2D, Dropout
+    return keras.models.Sequential([
+        keras.Input(shape=(28, 28, 1)),
+        Conv2D(32, kernel_size=(3, 3), activation='relu'),
+        MaxPooling2D(pool_size=(2, 2)),
+        Conv2D(64, kernel_size=(3, 3), activation='relu'),
+        MaxPooling2D(pool_size=(2, 2)),
+        Flatten(),
+        Dense(128, activation='relu'),
+        Dropout(0.5),
+        # Kept in float32 under mixed precision so the softmax stays stable
+        Dense(10, activation='softmax', dtype='float32')
+    ])
+
+
+def export_numpy_bundle(keras_model, path: str):
+    """Writes the model weights as one .npy file per array plus a manifest."""
+    weights = keras_model.get_weights()
+    expected = sum(count for _, count in ARCHITECTURE)
+    if len(weights) != expected:
+        raise ValueError(f"Expected {expected} weight arrays, got {len(weights)}")
+
+    os.makedirs(path, exist_ok=True)
+    for i, array in enumerate(weights):
+        np.save(os.path.join(path, f"{i}.npy"), np.ascontiguousarray(array, dtype=np.float32))
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump({"format": BUNDLE_FORMAT, "shapes": [list(w.shape) for w in weights]}, f)
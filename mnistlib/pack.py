@@ -0,0 +1,45 @@
+import fcntl
+import os
+import numpy as np
+
+# Append-only shard of preprocessed corrections: one 28x28 uint8 record per
+# correction, addressed by the `record` column of the corrections table
+PACK_PATH = "/app/data/corrections/corrections.u8"
+RECORD_SIZE = 28 * 28
+
+
+def append_image(img_array, path: str = None) -> int:
+    """Appends one 28x28 uint8 image and returns its record index."""
+    return append_images(np.asarray(img_array)[None], path)
+
+
+def append_images(images, path: str = None) -> int:
+    """Appends 28x28 uint8 images in one write and returns the record index of the first.
+
+    An exclusive lock serializes appends from every worker process.
+    """
+    path = path or PACK_PATH
+    records = np.ascontiguousarray(images, dtype=np.uint8).reshape(-1, RECORD_SIZE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "ab") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            size = f.seek(0, os.SEEK_END)
+            if size % RECORD_SIZE:
+                # Drop the tail of a write interrupted by a crash
+                size -= size % RECORD_SIZE
+                f.truncate(size)
+            f.write(records.tobytes())
+            f.flush()
+            return size // RECORD_SIZE
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def open_pack(path: str = None):
+    """Memory-maps the whole shard as a read-only (N, 28, 28) uint8 array."""
+    path = path or PACK_PATH
+    if not os.path.exists(path) or os.path.getsize(path) < RECORD_SIZE:
+        return np.zeros((0, 28, 28), dtype=np.uint8)
+    count = os.path.getsize(path) // RECORD_SIZE
+    return np.memmap(path, dtype=np.uint8, mode="r", shape=(count, 28, 28))
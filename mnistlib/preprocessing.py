@@ -0,0 +1,55 @@
+import io
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+RAW_IMAGE_SIZE = 28 * 28
+NPY_MAGIC = b"\x93NUMPY"
+IMAGE_SIGNATURES = (b"\x89PNG", b"\xff\xd8", b"GIF8")
+# Checked from the header, before any pixel is decoded
+MAX_IMAGE_PIXELS = 4096 * 4096
+
+
+def decode_image(image_bytes):
+    """Decodes one image to a (28, 28, 1) uint8 array.
+
+    Accepts an encoded image (PNG, JPEG...), a raw 784-byte grayscale buffer
+    or a .npy array. Normalization is left to `normalize`, which runs once
+    per batch.
+    """
+    # Raw 28x28 grayscale buffer: no decode at all, just a view on the bytes
+    if len(image_bytes) == RAW_IMAGE_SIZE and not image_bytes.startswith(IMAGE_SIGNATURES):
+        return np.frombuffer(image_bytes, dtype=np.uint8).reshape(28, 28, 1)
+    if image_bytes.startswith(NPY_MAGIC):
+        return decode_npy(image_bytes).reshape(28, 28, 1)
+
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+    except UnidentifiedImageError:
+        raise ValueError("Not a supported image")
+    if img.width * img.height > MAX_IMAGE_PIXELS:
+        raise ValueError(f"Image of {img.width}x{img.height} pixels is too large")
+    # Lets JPEG decode straight to a downscaled grayscale image
+    img.draft('L', (28, 28))
+    # Resizing a single channel is cheaper than resizing RGBA
+    img = img.convert('L')
+    if img.size != (28, 28):
+        # reducing_gap shrinks large inputs with a fast box reduce first
+        img = img.resize((28, 28), reducing_gap=2.0)
+    return np.asarray(img).reshape(28, 28, 1)
+
+
+def decode_npy(npy_bytes):
+    """Loads a uint8 .npy payload as (N, 28, 28, 1) images."""
+    array = np.load(io.BytesIO(npy_bytes), allow_pickle=False)
+    if array.dtype != np.uint8:
+        raise ValueError(f"Expected a uint8 array, got {array.dtype}")
+    if array.size % (28 * 28) != 0:
+        raise ValueError(f"Array of shape {array.shape} does not hold 28x28 images")
+    return array.reshape(-1, 28, 28, 1)
+
+
+def normalize(images):
+    """Scales uint8 pixels to float32 in [0, 1]; float input is returned as is."""
+    if images.dtype == np.uint8:
+        return images.astype(np.float32) * np.float32(1 / 255)
+    return images
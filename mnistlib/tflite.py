@@ -0,0 +1,56 @@
+import importlib.util
+import threading
+import numpy as np
+
+STANDALONE_RUNTIMES = ("ai_edge_litert", "tflite_runtime")
+
+
+def standalone_interpreter_available():
+    """True if a .tflite model can be run without importing TensorFlow."""
+    return any(importlib.util.find_spec(name) is not None for name in STANDALONE_RUNTIMES)
+
+
+def load_interpreter_class():
+    # Lazy import: the standalone LiteRT runtime when installed, else the one
+    # bundled with TensorFlow
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteModel:
+    """Runs a .tflite model behind the same `predict_on_batch` as a Keras model.
+
+    Takes float32 images in [0, 1]; quantized variants keep float input and
+    output and quantize internally.
+    """
+
+    def __init__(self, model_path=None, model_content=None, num_threads=None):
+        Interpreter = load_interpreter_class()
+        self._interpreter = Interpreter(model_path=model_path, model_content=model_content, num_threads=num_threads)
+        self._input = self._interpreter.get_input_details()[0]["index"]
+        self._output = self._interpreter.get_output_details()[0]["index"]
+        self._batch_size = None
+        # An interpreter holds its tensors, so calls must not overlap
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, num_threads=None):
+        return cls(model_path=path, num_threads=num_threads)
+
+    def predict_on_batch(self, x):
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        with self._lock:
+            if len(x) != self._batch_size:
+                self._interpreter.resize_tensor_input(self._input, list(x.shape))
+                self._interpreter.allocate_tensors()
+                self._batch_size = len(x)
+            self._interpreter.set_tensor(self._input, x)
+            self._interpreter.invoke()
+            return self._interpreter.get_tensor(self._output).copy()
@@ -0,0 +1,117 @@
+import os
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.layers import RandomRotation, RandomZoom, RandomTranslation
+
+TRAIN_BATCH_SIZE = int(os.getenv("TRAIN_BATCH_SIZE", "64"))
+# float16 compute with float32 weights; only pays off on hardware with fast fp16
+TRAIN_MIXED_PRECISION = os.getenv("TRAIN_MIXED_PRECISION", "0") == "1"
+# XLA compilation of the training step
+TRAIN_JIT_COMPILE = os.getenv("TRAIN_JIT_COMPILE", "0") == "1"
+# 0 lets TensorFlow pick (one thread per core)
+TRAIN_INTRA_OP_THREADS = int(os.getenv("TRAIN_INTRA_OP_THREADS", "0"))
+TRAIN_INTER_OP_THREADS = int(os.getenv("TRAIN_INTER_OP_THREADS", "0"))
+
+INPUT_SHARDS = int(os.getenv("INPUT_SHARDS", "4")) # Shards read in parallel per source
+SHUFFLE_BUFFER = 10000 # Indices, not images
+READ_CHUNK = 256
+AUTOTUNE = tf.data.AUTOTUNE
+
+
+def configure():
+    """Applies the thread and precision settings. Call before any TensorFlow op runs."""
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(TRAIN_INTRA_OP_THREADS)
+        tf.config.threading.set_inter_op_parallelism_threads(TRAIN_INTER_OP_THREADS)
+    except RuntimeError:
+        # The runtime is already initialized, keep its thread pools
+        pass
+    tf.keras.mixed_precision.set_global_policy("mixed_float16" if TRAIN_MIXED_PRECISION else "float32")
+
+
+def compile_model(model, learning_rate=None):
+    optimizer = tf.keras.optimizers.Adam(learning_rate=learning_rate) if learning_rate else 'adam'
+    model.compile(loss='categorical_crossentropy', optimizer=optimizer, metrics=['accuracy'],
+                  jit_compile=TRAIN_JIT_COMPILE)
+    return model
+
+
+def augmentation():
+    # Same transformations as the former ImageDataGenerator, run on whole batches
+    return tf.keras.Sequential([
+        RandomRotation(10 / 360, fill_mode='nearest'),
+        RandomZoom(0.1, fill_mode='nearest'),
+        RandomTranslation(0.1, 0.1, fill_mode='nearest'),
+    ])
+
+
+def normalize(images, labels):
+    return tf.cast(images, tf.float32) / 255, tf.one_hot(labels, 10)
+
+
+def stream_source(x, y):
+    """Endless shuffled stream of (image, label) pairs read from x and y.
+
+    The source is split into strided shards read in parallel; only indices sit
+    in the shuffle buffers, images are fetched chunk by chunk, so memory does
+    not grow with the size of the source.
+    """
+    count = len(x)
+    shards = min(INPUT_SHARDS, count)
+
+    def read(idx):
+        return np.asarray(x[idx], dtype=np.uint8).reshape(-1, 28, 28, 1), np.asarray(y[idx], dtype=np.int64)
+
+    def read_chunk(idx):
+        images, labels = tf.numpy_function(read, [idx], (tf.uint8, tf.int64))
+        return tf.ensure_shape(images, [None, 28, 28, 1]), tf.ensure_shape(labels, [None])
+
+    def shard(i):
+        return (tf.data.Dataset.range(i, count, shards)
+                .shuffle(SHUFFLE_BUFFER)
+                .repeat()
+                .batch(READ_CHUNK)
+                .map(read_chunk, num_parallel_calls=AUTOTUNE)
+                .unbatch())
+
+    return tf.data.Dataset.range(shards).interleave(
+        shard, cycle_length=shards, num_parallel_calls=AUTOTUNE, deterministic=False)
+
+
+def training_dataset(sources, weights, batch_size=None):
+    """Batches sampled from the (x, y) sources in proportion to weights, normalized and augmented."""
+    streams, shares = [], []
+    for (x, y), weight in zip(sources, weights):
+        if len(x) and weight > 0:
+            streams.append(stream_source(x, y))
+            shares.append(weight)
+    shares = [share / sum(shares) for share in shares]
+    dataset = streams[0] if len(streams) == 1 else tf.data.Dataset.sample_from_datasets(streams, weights=shares)
+    aug = augmentation()
+    return (dataset
+            .batch(batch_size or TRAIN_BATCH_SIZE, drop_remainder=True)
+            .map(normalize, num_parallel_calls=AUTOTUNE)
+            .map(lambda images, labels: (aug(images, training=True), labels), num_parallel_calls=AUTOTUNE)
+            .prefetch(AUTOTUNE))
+
+
+def eval_dataset(x, y, batch_size=1024):
+    return (tf.data.Dataset.from_tensor_slices((np.asarray(x, dtype=np.uint8), np.asarray(y, dtype=np.int64)))
+            .batch(batch_size)
+            .map(normalize, num_parallel_calls=AUTOTUNE)
+            .prefetch(AUTOTUNE))
+
+
+def fit(model, sources, weights, samples_per_epoch, epochs, validation, callbacks=None, batch_size=None):
+    """Trains on `samples_per_epoch` images drawn from the weighted sources each epoch."""
+    batch_size = batch_size or TRAIN_BATCH_SIZE
+    return model.fit(training_dataset(sources, weights, batch_size),
+                     epochs=epochs,
+                     steps_per_epoch=max(1, samples_per_epoch // batch_size),
+                     validation_data=eval_dataset(*validation),
+                     callbacks=callbacks,
+                     verbose=1)
+
+
+def evaluate(model, x_test, y_test):
+    return float(model.evaluate(eval_dataset(x_test, y_test), verbose=0)[1])
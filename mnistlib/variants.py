@@ -0,0 +1,94 @@
+"""Quantized and pruned variants of a trained model, benchmarked for the registry.
+
+Each variant is evaluated on the test set and recorded with its accuracy,
+single-image latency and size, so the backend can serve the fastest one that
+is accurate enough.
+"""
+import gzip
+import os
+import time
+import numpy as np
+import tensorflow as tf
+from mnistlib.model import build_model
+from mnistlib.tflite import TFLiteModel
+
+# Fraction of each kernel zeroed by magnitude pruning; 0 skips the pruned variant
+PRUNE_SPARSITY = float(os.getenv("PRUNE_SPARSITY", "0"))
+LATENCY_RUNS = int(os.getenv("LATENCY_RUNS", "200"))
+CALIBRATION_SAMPLES = 200
+
+
+def convert_tflite(model, quantization, calibration=None):
+    """Converts a Keras model to TFLite; quantization is "float16" or "int8"."""
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        # Full integer kernels; activation ranges come from real images.
+        # Input and output stay float32 so callers do not change.
+        converter.representative_dataset = lambda: ([image[None]] for image in calibration)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    else:
+        raise ValueError(f"Unknown quantization: {quantization}")
+    return converter.convert()
+
+
+def prune(model, sparsity):
+    """Copy of model with the smallest-magnitude `sparsity` of each kernel set to zero."""
+    pruned = build_model()
+    weights = []
+    for array in model.get_weights():
+        if array.ndim > 1:
+            threshold = np.quantile(np.abs(array), sparsity)
+            array = np.where(np.abs(array) < threshold, 0, array).astype(array.dtype)
+        weights.append(array)
+    pruned.set_weights(weights)
+    return pruned
+
+
+def benchmark(predictor, x_test, y_test):
+    """Returns (test accuracy, median single-image latency in ms)."""
+    x = x_test.astype(np.float32) / 255
+    predictions = np.concatenate([np.asarray(predictor.predict_on_batch(x[i:i + 1000]))
+                                  for i in range(0, len(x), 1000)])
+    accuracy = float((predictions.argmax(axis=1) == np.asarray(y_test)).mean())
+
+    sample = x[:1]
+    predictor.predict_on_batch(sample)
+    timings = []
+    for _ in range(LATENCY_RUNS):
+        start = time.perf_counter()
+        predictor.predict_on_batch(sample)
+        timings.append(time.perf_counter() - start)
+    return accuracy, float(np.median(timings) * 1000)
+
+
+def entry(fmt, path, accuracy, latency_ms):
+    with open(path, "rb") as f:
+        # Zeroed weights only save space once compressed
+        compressed = len(gzip.compress(f.read()))
+    return {"format": fmt, "path": path, "accuracy": round(accuracy, 4), "latency_ms": round(latency_ms, 3),
+            "size_bytes": os.path.getsize(path), "gzip_bytes": compressed}
+
+
+def export_variants(model, keras_path, prefix, x_test, y_test, x_calibration):
+    """Writes the TFLite variants next to the Keras model and returns the registry entries.
+
+    `prefix` is the path without extension, e.g. /app/data/models/mnist_model-<version>.
+    """
+    calibration = (np.asarray(x_calibration[:CALIBRATION_SAMPLES]).astype(np.float32) / 255).reshape(-1, 28, 28, 1)
+    variants = {"float32": entry("keras", keras_path, *benchmark(model, x_test, y_test))}
+
+    candidates = [("float16", model, "float16"), ("int8", model, "int8")]
+    if PRUNE_SPARSITY > 0:
+        candidates.append(("pruned", prune(model, PRUNE_SPARSITY), "int8"))
+    for name, source, quantization in candidates:
+        content = convert_tflite(source, quantization, calibration)
+        path = f"{prefix}-{name}.tflite"
+        tmp_path = f"{os.path.dirname(path)}/.tmp-{os.path.basename(path)}"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        variants[name] = entry("tflite", path, *benchmark(TFLiteModel(model_content=content), x_test, y_test))
+    return variants
@@ -0,0 +1,77 @@
+"""Training input throughput and peak memory: ImageDataGenerator versus tf.data.
+
+Builds an MNIST-sized base set and a correction pack of synthetic digits on
+disk, then draws augmented batches through each pipeline in a fresh process
+(peak RSS is per process).
+
+    python bench/input_pipeline.py [--corrections 100000] [--batches 300]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+
+def build(workdir, corrections):
+    rng = np.random.default_rng(0)
+    for name, count in (("base", 60000), ("pack", corrections)):
+        np.save(os.path.join(workdir, f"{name}_x.npy"), rng.integers(0, 256, (count, 28, 28, 1), dtype=np.uint8))
+        np.save(os.path.join(workdir, f"{name}_y.npy"), rng.integers(0, 10, count, dtype=np.int64))
+
+
+def measure(mode, workdir, batches):
+    import flow
+    from mnistlib import training
+    load = lambda name: (np.load(os.path.join(workdir, f"{name}_x.npy"), mmap_mode="r"),
+                         np.load(os.path.join(workdir, f"{name}_y.npy"), mmap_mode="r"))
+    base, pack = load("base"), load("pack")
+
+    if mode == "imagedatagenerator":
+        # The former retrain_model: everything concatenated as float32, one-hot labels
+        from tensorflow.keras.preprocessing.image import ImageDataGenerator
+        from tensorflow.keras.utils import to_categorical
+        x = np.concatenate((base[0], pack[0])).astype("float32") / 255
+        y = to_categorical(np.concatenate((base[1], pack[1])), 10)
+        aug = ImageDataGenerator(rotation_range=10, zoom_range=0.1, width_shift_range=0.1, height_shift_range=0.1)
+        iterator = iter(aug.flow(x, y, batch_size=training.TRAIN_BATCH_SIZE))
+    else:
+        weights = [len(base[0]), flow.CORRECTION_OVERSAMPLE * len(pack[0])]
+        iterator = iter(training.training_dataset([base, pack], weights))
+
+    next(iterator)
+    start = time.perf_counter()
+    for _ in range(batches):
+        next(iterator)
+    elapsed = time.perf_counter() - start
+    return {"samples_per_s": round(batches * training.TRAIN_BATCH_SIZE / elapsed),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corrections", type=int, default=100000)
+    parser.add_argument("--batches", type=int, default=300)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(measure(args.mode, args.workdir, args.batches)))
+        sys.exit()
+
+    workdir = tempfile.mkdtemp()
+    build(workdir, args.corrections)
+    results = {"corrections": args.corrections}
+    for mode in ("imagedatagenerator", "tf.data"):
+        out = subprocess.run([sys.executable, __file__, "--mode", mode, "--workdir", workdir,
+                              "--batches", str(args.batches)], capture_output=True, text=True, check=True).stdout
+        results[mode] = json.loads(out.strip().splitlines()[-1])
+    print(json.dumps(results, indent=2))
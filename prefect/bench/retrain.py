@@ -0,0 +1,72 @@
+"""Wall-clock and test accuracy of full retraining versus fine-tuning.
+
+Simulates a batch of corrections (training digits shifted by a few pixels,
+the kind of offset a hand-drawn canvas produces), then retrains from the same
+base model both ways. Needs the MNIST download (or cache); --synthetic N
+renders N digits from a font instead, for machines without network access.
+
+    python bench/retrain.py [--corrections 500] [--base /app/data/mnist_model.h5] [--synthetic 12000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+import tensorflow as tf
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import flow
+
+
+def synthetic_mnist(count, rng):
+    """((x_train, y_train), (x_test, y_test)) of font-rendered digits, a sixth of them held out."""
+    labels = rng.integers(0, 10, count)
+    images = np.empty((count, 28, 28, 1), dtype=np.uint8)
+    for i, label in enumerate(labels):
+        img = Image.new("L", (56, 56), color=0)
+        font = ImageFont.load_default(size=int(rng.integers(30, 42)))
+        ImageDraw.Draw(img).text((28 + rng.integers(-4, 5), 28 + rng.integers(-4, 5)), str(label),
+                                 fill=255, font=font, anchor="mm", stroke_width=int(rng.integers(0, 3)), stroke_fill=255)
+        img = img.rotate(rng.uniform(-20, 20), resample=Image.BILINEAR)
+        images[i, :, :, 0] = np.asarray(img.resize((28, 28), Image.BILINEAR))
+    split = count * 5 // 6
+    return (images[:split], labels[:split]), (images[split:], labels[split:])
+
+
+def simulated_corrections(x, y, count, rng):
+    idx = rng.choice(len(x), size=count, replace=False)
+    shifts = rng.integers(-3, 4, size=(count, 2))
+    images = np.stack([np.roll(img, tuple(shift), axis=(0, 1)) for img, shift in zip(x[idx], shifts)])
+    return images, y[idx]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corrections", type=int, default=500)
+    parser.add_argument("--base", help="deployed model to start from; trained from scratch if omitted")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="use N font-rendered digits instead of MNIST")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    mnist_data = synthetic_mnist(args.synthetic, rng) if args.synthetic else flow.load_mnist()
+    (x_train, y_train), (x_test, y_test) = mnist_data
+    new = simulated_corrections(x_train, y_train, args.corrections, rng)
+    past = (np.zeros((0, 28, 28, 1), dtype=np.uint8), np.zeros(0, dtype=np.int64))
+    base = tf.keras.models.load_model(args.base) if args.base else flow.train_full(mnist_data, [past])
+
+    results = {"dataset": f"synthetic ({args.synthetic})" if args.synthetic else "mnist",
+               "corrections": args.corrections, "base_accuracy": round(flow.training.evaluate(base, x_test, y_test), 4)}
+    for mode in ("full", "finetune"):
+        start = time.perf_counter()
+        if mode == "full":
+            model = flow.train_full(mnist_data, [new])
+        else:
+            model = flow.train_finetune(base, mnist_data, new, past, seed=0)
+        elapsed = time.perf_counter() - start
+        results[mode] = {"wall_clock_s": round(elapsed, 1),
+                         "test_accuracy": round(flow.training.evaluate(model, x_test, y_test), 4),
+                         "corrections_accuracy": round(flow.training.evaluate(model, *new), 4)}
+    print(json.dumps(results, indent=2))
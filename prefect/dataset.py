@@ -0,0 +1,98 @@
+"""MNIST base set materialized once on the shared volume.
+
+The first call writes x/y train/test as .npy files (uint8 images shaped
+(N, 28, 28, 1), uint8 labels) with a manifest of SHA-256 checksums. Later calls
+memory-map them, so every training run shares the same pages instead of
+decoding and reshaping 70k images again. Normalization stays a per-batch step.
+
+    python dataset.py [--archive /path/to/mnist.npz]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+
+DATASET_DIR = os.getenv("DATASET_DIR", "/app/data/datasets/mnist")
+# Offline sources tried before the network download, in the keras mnist.npz format
+MNIST_ARCHIVES = [
+    os.getenv("MNIST_ARCHIVE", "/app/data/mnist.npz"),
+    os.path.expanduser("~/.keras/datasets/mnist.npz"),
+]
+ARRAYS = ("x_train", "y_train", "x_test", "y_test")
+DATASET_FORMAT = "mnist-u8-v1"
+
+_verified = set()
+
+
+def sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fetch(archive=None):
+    """Returns the raw arrays from the first archive found, else downloads them."""
+    for path in [archive] if archive else MNIST_ARCHIVES:
+        if path and os.path.exists(path):
+            with np.load(path) as data:
+                return {name: data[name] for name in ARRAYS}
+    from tensorflow.keras.datasets import mnist
+    (x_train, y_train), (x_test, y_test) = mnist.load_data()
+    return {"x_train": x_train, "y_train": y_train, "x_test": x_test, "y_test": y_test}
+
+
+def materialize(archive=None, path=None):
+    path = path or DATASET_DIR
+    arrays = fetch(archive)
+    tmp_dir = f"{path}.tmp-{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    checksums = {}
+    for name, array in arrays.items():
+        array = np.asarray(array, dtype=np.uint8)
+        if name.startswith("x_"):
+            array = array.reshape(-1, 28, 28, 1)
+        file_path = os.path.join(tmp_dir, f"{name}.npy")
+        np.save(file_path, array)
+        checksums[name] = sha256(file_path)
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump({"format": DATASET_FORMAT, "sha256": checksums}, f)
+
+    # Rename into place so concurrent readers never see a partial set
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_dir, path)
+
+
+def is_valid(path):
+    try:
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        return manifest["format"] == DATASET_FORMAT and all(
+            sha256(os.path.join(path, f"{name}.npy")) == manifest["sha256"][name] for name in ARRAYS)
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def load_mnist(path=None):
+    """Returns ((x_train, y_train), (x_test, y_test)) as read-only memory-mapped arrays."""
+    path = path or DATASET_DIR
+    # Checksums are verified once per process, later runs only map the files
+    if path not in _verified:
+        if not is_valid(path):
+            materialize(path=path)
+        _verified.add(path)
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+    return (arrays["x_train"], arrays["y_train"]), (arrays["x_test"], arrays["y_test"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--archive", help="mnist.npz to build from instead of the default sources")
+    args = parser.parse_args()
+
+    materialize(args.archive)
+    print(f"MNIST materialized in {DATASET_DIR}")
@@ -1,104 +1,346 @@
 import os
+import re
+import json
+import shutil
 import sqlite3
+import time
+from datetime import datetime, timezone
 import pandas as pd
 import numpy as np
 import requests
 import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, Conv2D, Flatten, MaxPooling2D, Dropout
-from tensorflow.keras.datasets import mnist
-from tensorflow.keras.utils import to_categorical
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
+from tensorflow.keras.callbacks import EarlyStopping
 from prefect import flow, task, get_run_logger
-from PIL import Image
+from dataset import load_mnist
+from mnistlib.model import build_model, export_numpy_bundle
+from mnistlib.variants import export_variants
+from mnistlib.preprocessing import decode_image
+from mnistlib.pack import open_pack, PACK_PATH
+from mnistlib import corrections, drift, training
 
 DB_PATH = "/app/data/corrections.db"
-MODEL_PATH = "/app/data/mnist_model.h5"
+MODEL_PATH = "/app/data/mnist_model.h5" # Legacy unversioned artifact
+MODEL_DIR = "/app/data/models"
+CURRENT_POINTER = os.path.join(MODEL_DIR, "current.json")
+REGISTRY_PATH = os.path.join(MODEL_DIR, "registry.json") # Variants of each kept version, with their benchmarks
+MODEL_KEEP_VERSIONS = int(os.getenv("MODEL_KEEP_VERSIONS", "3"))
+VERSION_PATTERN = re.compile(r"mnist_model-(\d+)")
 DRIFT_THRESHOLD = int(os.getenv("DRIFT_THRESHOLD", "5")) # Retrain if > 5 corrections
+RETRAIN_MODE = os.getenv("RETRAIN_MODE", "finetune") # finetune | full
+FINETUNE_EPOCHS = int(os.getenv("FINETUNE_EPOCHS", "10")) # Upper bound, early stopping usually ends sooner
+FINETUNE_LEARNING_RATE = float(os.getenv("FINETUNE_LEARNING_RATE", "1e-4"))
+REPLAY_RATIO = int(os.getenv("REPLAY_RATIO", "4")) # Replayed samples per new correction
+REPLAY_MIN = int(os.getenv("REPLAY_MIN", "2000"))
+ACCURACY_TOLERANCE = float(os.getenv("ACCURACY_TOLERANCE", "0.002")) # Allowed test accuracy drop
+CORRECTION_OVERSAMPLE = float(os.getenv("CORRECTION_OVERSAMPLE", "5")) # Corrections drawn 5x their natural share
+PSI_THRESHOLD = float(os.getenv("PSI_THRESHOLD", "0.2")) # Population stability index above which the traffic has shifted
+DRIFT_WINDOW_HOURS = float(os.getenv("DRIFT_WINDOW_HOURS", "24")) # Live statistics compared to the reference
+DRIFT_MIN_PREDICTIONS = int(os.getenv("DRIFT_MIN_PREDICTIONS", "500")) # Fewer gives no drift verdict
+# The backend triggers runs as corrections arrive; this schedule is only a safety net
+RETRAIN_CRON = os.getenv("RETRAIN_CRON", "0 3 * * *")
+
+training.configure()
+
+def model_exists():
+    return os.path.exists(CURRENT_POINTER) or os.path.exists(MODEL_PATH)
+
+def write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def read_registry():
+    try:
+        with open(REGISTRY_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def reference_path(version):
+    # Named like the other artifacts of the version so it is pruned with them
+    return os.path.join(MODEL_DIR, f"mnist_model-{version}_reference.json")
+
+def prediction_reference(model, x_test, y_test):
+    """Summary of the model's predictions on the test set, the distribution live traffic is compared to."""
+    probs = model.predict(training.eval_dataset(x_test, y_test), verbose=0)
+    return drift.to_json(drift.summarize(probs))
+
+def prune_versions(keep_version):
+    versions = sorted({match.group(1) for match in map(VERSION_PATTERN.match, os.listdir(MODEL_DIR)) if match})
+    removed = [version for version in versions[:-MODEL_KEEP_VERSIONS] if version != keep_version]
+    if not removed:
+        return
+    registry = read_registry()
+    for version in removed:
+        registry.pop(version, None)
+    write_json_atomic(REGISTRY_PATH, registry)
+    for name in os.listdir(MODEL_DIR):
+        match = VERSION_PATTERN.match(name)
+        if not match or match.group(1) not in removed:
+            continue
+        path = os.path.join(MODEL_DIR, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+
+def publish_model(model, mnist_data):
+    # Every artifact is written under a temporary name and renamed into place,
+    # and the pointer is switched last, so the backend never sees a partial file
+    logger = get_run_logger()
+    version = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    os.makedirs(MODEL_DIR, exist_ok=True)
+
+    keras_path = os.path.join(MODEL_DIR, f"mnist_model-{version}.h5")
+    tmp_path = os.path.join(MODEL_DIR, f".tmp-mnist_model-{version}.h5")
+    model.save(tmp_path)
+    os.replace(tmp_path, keras_path)
+
+    numpy_path = os.path.join(MODEL_DIR, f"mnist_model-{version}_npy")
+    tmp_dir = os.path.join(MODEL_DIR, f".tmp-mnist_model-{version}_npy")
+    export_numpy_bundle(model, tmp_dir)
+    os.replace(tmp_dir, numpy_path)
+
+    # Quantized variants, benchmarked on the test set for the backend to choose from
+    (x_train, _), (x_test, y_test) = mnist_data
+    variants = export_variants(model, keras_path, os.path.join(MODEL_DIR, f"mnist_model-{version}"),
+                               x_test, y_test, x_train)
+    for name, variant in variants.items():
+        logger.info(f"Variant {name}: accuracy {variant['accuracy']:.4f}, "
+                    f"{variant['latency_ms']:.3f} ms/image, {variant['size_bytes']} bytes")
+    registry = read_registry()
+    registry[version] = variants
+    write_json_atomic(REGISTRY_PATH, registry)
+    write_json_atomic(reference_path(version), prediction_reference(model, x_test, y_test))
+
+    write_json_atomic(CURRENT_POINTER, {"version": version, "keras": keras_path, "numpy": numpy_path})
+    prune_versions(version)
+    return version
 
 @task
 def check_corrections():
+    """Returns (unprocessed count, highest unprocessed id) without scanning the table."""
     logger = get_run_logger()
     if not os.path.exists(DB_PATH):
         logger.info("Database not found. No corrections yet.")
-        return []
-    
+        return 0, None
+
     conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query("SELECT * FROM corrections", conn)
+    count, max_id = corrections.pending(conn)
     conn.close()
-    
-    logger.info(f"Found {len(df)} corrections.")
-    return df
+
+    logger.info(f"Found {count} new (unprocessed) corrections.")
+    return count, max_id
 
 @task
-def retrain_model(corrections_df):
+def load_corrections(up_to_id):
+    # Every correction collected up to the watermark: full retraining uses them
+    # all, fine-tuning trains on the unprocessed ones and replays a sample of the others
+    columns = corrections.COLUMNS.split(", ")
+    if not os.path.exists(DB_PATH):
+        return pd.DataFrame(columns=columns)
+    conn = sqlite3.connect(DB_PATH)
+    df = pd.DataFrame.from_records(corrections.load(conn, up_to_id), columns=columns)
+    conn.close()
+    return df
+
+class RecordView:
+    """Selected records of the correction pack, read from the memory map on access."""
+
+    def __init__(self, pack, records):
+        self.pack = pack
+        self.records = records
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, idx):
+        return self.pack[self.records[idx]].reshape(-1, 28, 28, 1)
+
+def load_correction_images(corrections_df):
+    """Returns (images, labels) for the corrections; images index like an (N, 28, 28, 1) uint8 array.
+
+    Packed corrections are not copied: they are read from the pack as training
+    streams over them.
+    """
     logger = get_run_logger()
-    logger.info("Starting retraining process...")
-    
-    # Load base MNIST data
-    (x_train, y_train), (x_test, y_test) = mnist.load_data()
-    
-    # Preprocessing MNIST
-    x_train = x_train.reshape(x_train.shape[0], 28, 28, 1).astype('float32') / 255
-    x_test = x_test.reshape(x_test.shape[0], 28, 28, 1).astype('float32') / 255
-    y_train = to_categorical(y_train, 10)
-    y_test = to_categorical(y_test, 10)
-    
-    # Process corrections
-    new_images = []
-    new_labels = []
-    
-    for idx, row in corrections_df.iterrows():
+    packed = corrections_df[corrections_df["record"].notna()]
+    pack = open_pack()
+    records = packed["record"].astype(np.int64).to_numpy()
+    in_pack = records < len(pack)
+    if not in_pack.all():
+        logger.warning(f"{int((~in_pack).sum())} corrections point past the end of {PACK_PATH}")
+    records = records[in_pack]
+    labels = packed["true_label"].to_numpy()[in_pack].astype(np.int64)
+
+    # Rows written before the pack existed still reference PNG files
+    # (backend/migrate_corrections.py moves them into the pack)
+    legacy = corrections_df[corrections_df["record"].isna()]
+    if legacy.empty:
+        return RecordView(pack, records), labels
+    images, legacy_labels = [], []
+    for _, row in legacy.iterrows():
         try:
-            img_path = row['image_path']
-            true_label = row['true_label']
-            
-            img = Image.open(img_path).convert('L')
-            img = img.resize((28, 28))
-            img_array = np.array(img).astype('float32') / 255
-            img_array = img_array.reshape(28, 28, 1)
-            
-            new_images.append(img_array)
-            new_labels.append(true_label)
+            with open(row['image_path'], 'rb') as f:
+                images.append(decode_image(f.read()))
+            legacy_labels.append(row['true_label'])
         except Exception as e:
             logger.warning(f"Could not process correction image {row['image_path']}: {e}")
-            
-    if new_images:
-        new_x = np.array(new_images)
-        new_y = to_categorical(np.array(new_labels), 10)
-        
-        # Combine datasets
-        x_train = np.concatenate((x_train, new_x), axis=0)
-        y_train = np.concatenate((y_train, new_y), axis=0)
-        logger.info(f"Added {len(new_images)} correction images to training set.")
-        
-    # Data Augmentation
-    aug = ImageDataGenerator(rotation_range=10, zoom_range=0.1, width_shift_range=0.1, height_shift_range=0.1)
-    
-    # Build model (same architecture as backend to be consistent)
-    model = Sequential([
-        Conv2D(32, kernel_size=(3, 3), activation='relu', input_shape=(28, 28, 1)),
-        MaxPooling2D(pool_size=(2, 2)),
-        Conv2D(64, kernel_size=(3, 3), activation='relu'),
-        MaxPooling2D(pool_size=(2, 2)),
-        Flatten(),
-        Dense(128, activation='relu'),
-        Dropout(0.5),
-        Dense(10, activation='softmax')
-    ])
-    
-    model.compile(loss='categorical_crossentropy', optimizer='adam', metrics=['accuracy'])
-    
-    # Train
-    logger.info("Training model...")
-    model.fit(aug.flow(x_train, y_train, batch_size=64),
-              epochs=5, 
-              validation_data=(x_test, y_test),
-              verbose=1)
-              
-    # Save
-    model.save(MODEL_PATH)
-    logger.info(f"Model saved to {MODEL_PATH}")
+    x = np.concatenate([pack[records].reshape(-1, 28, 28, 1), np.array(images, dtype=np.uint8).reshape(-1, 28, 28, 1)])
+    y = np.concatenate([labels, np.array(legacy_labels, dtype=np.int64)])
+    return x, y
+
+def train_full(mnist_data, corrections):
+    """Trains a new model from scratch on all of MNIST plus every (x, y) correction set.
+
+    Corrections are drawn CORRECTION_OVERSAMPLE times more often than their
+    share of the data, so a few hundred of them still weigh against 60k digits.
+    """
+    (x_train, y_train), (x_test, y_test) = mnist_data
+    sources = [(x_train, y_train)] + list(corrections)
+    weights = [len(x_train)] + [CORRECTION_OVERSAMPLE * len(x) for x, _ in corrections]
+    total = sum(len(x) for x, _ in sources)
+
+    model = training.compile_model(build_model())
+    training.fit(model, sources, weights, total, epochs=5, validation=(x_test, y_test))
+    return model
+
+def train_finetune(base_model, mnist_data, new, past, seed=None):
+    """Continues training base_model on the new corrections mixed with a replay sample.
+
+    Replayed samples (base MNIST and earlier corrections, REPLAY_RATIO per new
+    correction) keep the model from forgetting what it already knows. A tenth
+    of the new corrections, with as many replayed digits, is held out for early
+    stopping, so the test set stays untouched for the accuracy gate.
+    """
+    rng = np.random.default_rng(seed)
+    (x_base, y_base), _ = mnist_data
+    order = rng.permutation(len(new[0]))
+    split = len(order) // 10
+    val_new, train_new = order[:split], order[split:]
+    val_base = rng.choice(len(x_base), size=max(split * REPLAY_RATIO, 500), replace=False)
+    x_val = np.concatenate((new[0][val_new], x_base[np.sort(val_base)]))
+    y_val = np.concatenate((new[1][val_new], y_base[np.sort(val_base)]))
+
+    # The new corrections make up 1 / (1 + REPLAY_RATIO) of what is drawn,
+    # earlier corrections at most a quarter of the replay
+    replay_share = REPLAY_RATIO / (1 + REPLAY_RATIO)
+    past_share = replay_share / 4 if len(past[0]) else 0
+    sources = [(new[0][train_new], new[1][train_new]), past, mnist_data[0]]
+    weights = [1 - replay_share, past_share, replay_share - past_share]
+    samples = max(REPLAY_MIN, (1 + REPLAY_RATIO) * len(train_new))
+
+    # Rebuilt from the shared definition so the current precision policy applies
+    model = build_model()
+    model.set_weights(base_model.get_weights())
+    training.compile_model(model, learning_rate=FINETUNE_LEARNING_RATE)
+    training.fit(model, sources, weights, samples, epochs=FINETUNE_EPOCHS, validation=(x_val, y_val),
+                 callbacks=[EarlyStopping(monitor='val_loss', patience=2, restore_best_weights=True)])
+    return model
+
+def deployed_artifact():
+    """Returns (version, keras path) of the model the backend currently serves."""
+    if os.path.exists(CURRENT_POINTER):
+        with open(CURRENT_POINTER) as f:
+            pointer = json.load(f)
+        return pointer["version"], pointer["keras"]
+    return "legacy", MODEL_PATH
+
+def deployed_model():
+    """Loads the model the backend currently serves, or None."""
+    path = deployed_artifact()[1]
+    if not os.path.exists(path):
+        return None
+    return tf.keras.models.load_model(path)
+
+def load_reference(version):
+    path = reference_path(version)
+    if not os.path.exists(path):
+        # Published before references existed: compute it once from the served model
+        model = deployed_model()
+        if model is None:
+            return None
+        x_test, y_test = load_mnist()[1]
+        # A legacy deployment has no model directory yet
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        write_json_atomic(path, prediction_reference(model, x_test, y_test))
+    with open(path) as f:
+        return json.load(f)
+
+@task
+def check_drift():
+    """Compares recent live predictions with the test set reference of the served model.
+
+    Returns True if the traffic has shifted, False if it has not, and None when
+    there are too few predictions to tell.
+    """
+    logger = get_run_logger()
+    version = deployed_artifact()[0]
+    if not os.path.exists(DB_PATH):
+        return None
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        rows = conn.execute("SELECT predictions, low_confidence, summary FROM prediction_stats "
+                            "WHERE model_version = ? AND timestamp >= datetime('now', ?)",
+                            (version, f"-{DRIFT_WINDOW_HOURS} hours")).fetchall()
+    except sqlite3.OperationalError:
+        # Created by the backend at startup
+        rows = []
+    conn.close()
+
+    live = drift.merge({"count": count, "low_confidence": low, **json.loads(summary)} for count, low, summary in rows)
+    if live["count"] < DRIFT_MIN_PREDICTIONS:
+        logger.info(f"Only {live['count']} predictions of version {version} in the last {DRIFT_WINDOW_HOURS:g} h, "
+                    f"no drift verdict (minimum {DRIFT_MIN_PREDICTIONS}).")
+        return None
+    reference = load_reference(version)
+    if reference is None:
+        return None
+
+    scores = drift.compare(reference, live)
+    drifted = max(scores[field] for field in drift.FIELDS) > PSI_THRESHOLD
+    details = ", ".join(f"{name} {value:+.3f}" if name.endswith("delta") else f"{name} PSI {value:.3f}"
+                        for name, value in scores.items())
+    logger.info(f"{'[DRIFT]' if drifted else '[OK]'} {live['count']} predictions of version {version}: {details}")
+    return drifted
+
+@task
+def retrain_model(corrections_df, mode=None):
+    logger = get_run_logger()
+    mode = mode or RETRAIN_MODE
+    base_model = deployed_model()
+    if base_model is None:
+        mode = "full"
+    logger.info(f"Starting retraining process ({mode})...")
+
+    mnist_data = load_mnist()
+    x_test, y_test = mnist_data[1]
+    is_new = (corrections_df["processed"] == 0).to_numpy()
+    new = load_correction_images(corrections_df[is_new])
+    past = load_correction_images(corrections_df[~is_new])
+    logger.info(f"Loaded {len(new[0])} new and {len(past[0])} past correction images.")
+
+    start = time.perf_counter()
+    if mode == "finetune":
+        model = train_finetune(base_model, mnist_data, new, past)
+    else:
+        model = train_full(mnist_data, [new, past])
+    elapsed = time.perf_counter() - start
+    accuracy = training.evaluate(model, x_test, y_test)
+    logger.info(f"{mode} training took {elapsed:.1f}s, test accuracy {accuracy:.4f}")
+
+    # Accuracy gate: never promote a model that is worse than the one being served
+    if base_model is not None:
+        deployed_accuracy = training.evaluate(base_model, x_test, y_test)
+        if accuracy < deployed_accuracy - ACCURACY_TOLERANCE:
+            logger.warning(f"Rejected candidate: test accuracy {accuracy:.4f} < deployed {deployed_accuracy:.4f}")
+            return False
+
+    version = publish_model(model, mnist_data)
+    logger.info(f"Model version {version} published to {MODEL_DIR}")
     return True
 
 @task
@@ -106,66 +348,88 @@ def notify_backend():
     logger = get_run_logger()
     try:
         response = requests.post("http://backend:8000/reload")
-        if response.status_code == 200:
-            logger.info("Backend successfully reloaded model.")
+        if response.ok:
+            logger.info(f"Backend reload started (active version: {response.json().get('active_version')}).")
         else:
             logger.error(f"Backend failed to reload model: {response.status_code}")
     except Exception as e:
         logger.error(f"Error calling backend reload: {e}")
 
 @task
-def mark_processed(ids):
+def mark_processed(up_to_id):
+    # Watermark update: corrections that arrived during retraining keep processed = 0
     logger = get_run_logger()
-    if not ids:
+    if up_to_id is None:
         return
     try:
         conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(f'UPDATE corrections SET processed = 1 WHERE id IN ({",".join(map(str, ids))})')
-        conn.commit()
+        count = corrections.mark_processed(conn, up_to_id)
         conn.close()
-        logger.info(f"Marked {len(ids)} corrections as processed.")
+        logger.info(f"Marked {count} corrections as processed.")
     except Exception as e:
         logger.error(f"Error marking corrections as processed: {e}")
 
+@task
+def record_run(up_to_id, published=None):
+    # Lets the backend wait for new corrections before asking for another run;
+    # None when the run decided not to train
+    logger = get_run_logger()
+    if up_to_id is None:
+        return
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        corrections.record_run(conn, up_to_id, published)
+        conn.close()
+    except sqlite3.OperationalError as e:
+        # correction_stats is created by the backend at startup
+        logger.warning(f"Could not record the run outcome: {e}")
+
 @flow(name="mnist_retraining_flow")
 def mnist_retraining_flow():
     logger = get_run_logger()
     logger.info("Checking for model drift/corrections...")
     
-    corrections = check_corrections()
-    
-    if corrections.empty:
-        logger.info("No corrections found.")
-        return
+    unprocessed_count, max_unprocessed_id = check_corrections()
 
-    # Check for unprocessed corrections
-    if 'processed' not in corrections.columns:
-        # Handle case where column might be missing if DB wasn't migrated (though backend init_db does it)
-        # or if older records exist. 
-        # For robustness, assume all are unprocessed if column missing, or 0.
-        # But we added the column in backend. The flow reads what's there.
-        # If the column is missing in the DF, it means the SELECT * didn't return it? 
-        # SQLite adds column on ALTER, so it should be there.
-        unprocessed_count = len(corrections)
-        unprocessed_ids = corrections['id'].tolist()
-    else:
-        # Filter where processed == 0 or False (SQLite uses 0/1)
-        unprocessed = corrections[corrections['processed'] == 0]
-        unprocessed_count = len(unprocessed)
-        unprocessed_ids = unprocessed['id'].tolist()
-    
-    logger.info(f"Found {len(corrections)} total corrections, {unprocessed_count} new (unprocessed).")
-
-    # Logic: If we have enough NEW corrections
-    if unprocessed_count > DRIFT_THRESHOLD: 
-        logger.info(f"Threshold exceeded ({unprocessed_count} > {DRIFT_THRESHOLD}). Retraining model.")
-        success = retrain_model(corrections)
-        if success:
-            notify_backend()
-            mark_processed(unprocessed_ids)
-    else:
-        logger.info(f"Not enough new data to justify retraining (Threshold: {DRIFT_THRESHOLD}).")
+    # Recorded however the run ends, so the backend waits for new corrections
+    # instead of asking again; a run that raises counts as one without a model
+    published = False
+    try:
+        # The backend never trains: it stays "not ready" until this produces a model
+        if not model_exists():
+            logger.info(f"No model found in {MODEL_DIR}. Training initial model.")
+            published = retrain_model(load_corrections(max_unprocessed_id))
+            if published:
+                notify_backend()
+                mark_processed(max_unprocessed_id)
+            return
+
+        # Corrections are what the model learns from; the drift verdict decides
+        # whether they are worth a retrain. Without a verdict, the count alone decides.
+        drifted = check_drift()
+        if drifted is False and unprocessed_count > DRIFT_THRESHOLD:
+            logger.info(f"[OK] {unprocessed_count} new corrections but no distribution shift "
+                        f"(PSI <= {PSI_THRESHOLD}). Not retraining.")
+            published = None
+        elif unprocessed_count > DRIFT_THRESHOLD or (drifted and unprocessed_count > 0):
+            reason = "Distribution shift detected" if drifted else f"Threshold exceeded ({unprocessed_count} > {DRIFT_THRESHOLD})"
+            logger.info(f"[RETRAINING] {reason}. Retraining model on {unprocessed_count} new corrections.")
+            published = retrain_model(load_corrections(max_unprocessed_id))
+            if published:
+                notify_backend()
+                mark_processed(max_unprocessed_id)
+        elif drifted:
+            logger.warning("[ALERT] Distribution shift detected but no new corrections to retrain on.")
+            published = None
+        else:
+            logger.info(f"Not enough new data to justify retraining (Threshold: {DRIFT_THRESHOLD}).")
+            published = None
+    finally:
+        record_run(max_unprocessed_id, published)
 
 if __name__ == "__main__":
-    mnist_retraining_flow.serve(name="mnist-retraining-deployment", cron="0 * * * *") # Every hour
\ No newline at end of file
+    if not model_exists():
+        # Produce the first model right away instead of waiting for the first scheduled run
+        mnist_retraining_flow()
+    # One retraining at a time, whether started by the schedule or by the backend
+    mnist_retraining_flow.serve(name="mnist-retraining-deployment", cron=RETRAIN_CRON, global_limit=1, limit=1)